@@ -3,21 +3,41 @@ using JSON
 using DataFrames
 using BenchmarkTools
 using MosekTools
+using Mmap
 
 function read_tuple_list(filename)
     return [tuple(x...) for x in JSON.parsefile(filename)]
 end
 
-function read_fixed_data()
+# binary exchange file of help.save_to_bin: magic, rows and columns as Int64,
+# then the rows of Int32 entries, mapped as one column per row
+function read_tuple_bin(filename)
+    open(filename) do io
+        read(io, 8) == b"PEXINT32" || error("$filename is not an exchange file")
+        rows, cols = read(io, Int64), read(io, Int64)
+        data = Mmap.mmap(io, Matrix{Int32}, (cols, rows), 24)
+        return [Tuple(c) for c in eachcol(data)]
+    end
+end
+
+function read_set(name, exchange)
+    if exchange == "bin"
+        return read_tuple_bin("IJKLM/data/data_$name.bin")
+    end
+    return read_tuple_list("IJKLM/data/data_$name.json")
+end
+
+function read_fixed_data(exchange)
     N = open(JSON.parse, "IJKLM/data/data_N.json")
-    JKL = read_tuple_list("IJKLM/data/data_JKL.json")
-    KLM = read_tuple_list("IJKLM/data/data_KLM.json")
+    JKL = read_set("JKL", exchange)
+    KLM = read_set("KLM", exchange)
     return N, JKL, KLM
 end
 
-function read_variable_data(n)
-    I = ["i$i" for i in 1:n]
-    IJK = read_tuple_list("IJKLM/data/data_IJK_$n.json")
+function read_variable_data(n, exchange)
+    # integer codes start at 0, labels at i1
+    I = exchange == "bin" ? Int32.(0:n-1) : ["i$i" for i in 1:n]
+    IJK = read_set("IJK_$n", exchange)
     return I, IJK
 end
 
@@ -33,7 +53,9 @@ function jump(I, IJK, JKL, KLM, solve)
 
     @variable(model, x[x_list] >= 0)
 
-    @constraint(model, [i in I], sum(
+    # one row per product with at least one x, as in the other runners
+    I_x = Set(xi[1] for xi in x_list)
+    @constraint(model, [i in I; i in I_x], sum(
         x[(i, j, k, l, m)]
         for (ii, j, k) in IJK if ii == i
         for (jj, kk, l) in JKL if jj == j && kk == k
@@ -47,6 +69,7 @@ function jump(I, IJK, JKL, KLM, solve)
         set_silent(model)
         optimize!(model)
     end
+    return model
 end
 
 function fast_jump(I, IJK, JKL, KLM, solve)
@@ -71,13 +94,56 @@ function fast_jump(I, IJK, JKL, KLM, solve)
     for xi in x_list
         push!(x_filter_i[xi[1]], xi)
     end
-    @constraint(model, [i in I], sum(x[k] for k in x_filter_i[i]) >= 0)
+    @constraint(model, [i in I; !isempty(x_filter_i[i])], sum(x[k] for k in x_filter_i[i]) >= 0)
 
     if solve == "True"
         set_silent(model)
         set_time_limit_sec(model, 0)
         optimize!(model)
     end
+    return model
+end
+
+# worker mode, driven by julia_worker.JuliaWorker
+function run_job(job)
+    language, n, exchange = job["language"], job["n"], job["exchange"]
+    solve = job["solve"] ? "True" : "False"
+    _, JKL, KLM = read_fixed_data(exchange)
+    I, IJK = read_variable_data(n, exchange)
+
+    model = language == "Fast JuMP" ? fast_jump : jump
+    r = @benchmark $model($I, $IJK, $JKL, $KLM, $solve) samples = job["repeats"] evals = job["number"]
+
+    # size of one more, untimed build, without the bounds x >= 0
+    built = model(I, IJK, JKL, KLM, "False")
+    return Dict(
+        "I" => n,
+        "Language" => language,
+        "times" => r.times ./ 1e9,
+        "variables" => num_variables(built),
+        "constraints" => num_constraints(built; count_variable_in_set_constraints=false),
+    )
+end
+
+function serve()
+    # one JSON job per line on stdin, one JSON reply per line on stdout,
+    # everything else printed goes to stderr
+    out = stdout
+    redirect_stdout(stderr)
+    for line in eachline(stdin)
+        reply = try
+            run_job(JSON.parse(line))
+        catch e
+            Dict("error" => sprint(showerror, e))
+        end
+        println(out, JSON.json(reply))
+        flush(out)
+    end
+end
+
+if length(ARGS) >= 1 && ARGS[1] == "worker"
+    serve()
+    exit()
 end
 
 # standalone 
@@ -91,14 +157,15 @@ solve = ARGS[1]
 samples = parse(Int64, ARGS[2])
 evals = parse(Int64, ARGS[3])
 time_limit = parse(Int64, ARGS[4])
+exchange = length(ARGS) >= 5 ? ARGS[5] : "json"
 
-N, JKL, KLM = read_fixed_data()
+N, JKL, KLM = read_fixed_data(exchange)
 
 t = DataFrame(I=Int[], Language=String[], MinTime=Float64[], MeanTime=Float64[], MedianTime=Float64[])
 tt = DataFrame(I=Int[], Language=String[], MinTime=Float64[], MeanTime=Float64[], MedianTime=Float64[])
 
 for n in N
-    I, IJK = read_variable_data(n)
+    I, IJK = read_variable_data(n, exchange)
 
     if maximum(t.MinTime; init=0) < time_limit
         r = @benchmark fast_jump($I, $IJK, $JKL, $KLM, $solve) samples = samples evals = evals
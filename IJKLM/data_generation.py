@@ -1,6 +1,13 @@
 import pandas as pd
 import numpy as np
-from collections import defaultdict
+
+# integer coded sets, see sparse_index
+from sparse_index import (
+    PrefixIndex,
+    RowBuffer,
+    num_to_labels,
+    as_tuples,
+)
 
 
 ########## Data ##########
@@ -24,80 +31,129 @@ def create_fixed_data(m):
     return J, K, L, M, jkl, klm
 
 
-def create_variable_data(n, j, k):
-    i = [f"i{x}" for x in range(1, n + 1)]
+def create_fixed_num_data(m):
+    J = np.arange(m, dtype=np.int32)
+    K = np.arange(m, dtype=np.int32)
+    L = np.arange(m, dtype=np.int32)
+    M = np.arange(m, dtype=np.int32)
 
-    ijk = pd.DataFrame(
-        np.random.binomial(1, 0.05, size=(len(i) * len(j) * len(k))),
-        index=pd.MultiIndex.from_product([i, j, k], names=["i", "j", "k"]),
-        columns=["value"],
-    ).reset_index()
+    # same draws as create_fixed_data, kept as integer positions
+    jkl = np.random.binomial(1, 0.05, size=(len(J), len(K), len(L)))
+    klm = np.random.binomial(1, 0.05, size=(len(K), len(L), len(M)))
+    jkl = np.column_stack(np.nonzero(jkl)).astype(np.int32)
+    klm = np.column_stack(np.nonzero(klm)).astype(np.int32)
 
-    return i, ijk
+    return J, K, L, M, jkl, klm
 
 
-def fixed_data_to_tuples(JKL, KLM):
-    jkl = [
-        tuple(x)
-        for x in JKL.loc[JKL["value"] == 1][["j", "k", "l"]].to_dict("split")["data"]
-    ]
-    klm = [
-        tuple(x)
-        for x in KLM.loc[KLM["value"] == 1][["k", "l", "m"]].to_dict("split")["data"]
-    ]
-    return jkl, klm
+def create_sparse_variable_data(n, j, k, chunk_size=2**20):
+    i = np.arange(n, dtype=np.int32)
 
+    # draw one binomial per (i, j, k) in the order of from_product, a block
+    # of products at a time, and keep only the positions of the nonzeros.
+    # Peak memory is bounded by chunk_size + nnz instead of |I|*|J|*|K|.
+    jk = len(j) * len(k)
+    rows = max(1, chunk_size // max(1, jk))
+    nnz = [np.empty(0, dtype=np.int64)]
+    for start in range(0, n, rows):
+        draws = np.random.binomial(1, 0.05, size=min(rows, n - start) * jk)
+        nnz.append(np.flatnonzero(draws) + start * jk)
+    nnz = np.concatenate(nnz)
 
-def variable_data_to_tuples(IJK):
-    ijk = [
-        tuple(x)
-        for x in IJK.loc[IJK["value"] == 1][["i", "j", "k"]].to_dict("split")["data"]
-    ]
-    return ijk
+    # integer (i, j, k) positions, 0-based, in the order of from_product
+    ijk = np.column_stack(np.unravel_index(nnz, (n, len(j), len(k)))).astype(np.int32)
+
+    return i, ijk
+
+
+def iterate_sparse_variable_data(N, J, K, L, M, jkl, klm, seed=13, block=1024):
+    # Yields (I, ijk, nnz_idx) for every n of the increasing sizes N, with
+    # nnz_idx as in data_to_nnz_idx. Products are drawn and joined in blocks of
+    # block products, every block once, and the data for n are views of the
+    # rows of the products i < n, so a step only costs the new products.
+    #
+    # Seed contract: the rows of product i depend only on seed, the block of i
+    # and |J|, |K|, not on n or on the sizes drawn before. They differ from the
+    # global stream of create_sparse_variable_data.
+    ijk, jklm, ptr = RowBuffer(), RowBuffer(), RowBuffer()
+    ptr.extend(np.zeros(1, dtype=np.int64))
+    drawn = 0
+    for n in N:
+        while drawn < n:
+            rng = np.random.default_rng([seed, drawn // block])
+            draws = rng.binomial(1, 0.05, size=(block, len(J), len(K)))
+            block_ijk = np.column_stack(np.nonzero(draws)).astype(np.int32)
+            block_ptr, block_jklm = data_to_nnz_idx(
+                np.arange(block), J, K, L, M, block_ijk, jkl, klm
+            )
+
+            block_ijk[:, 0] += drawn
+            ijk.extend(block_ijk)
+            jklm.extend(block_jklm)
+            ptr.extend(block_ptr[1:] + ptr.rows[ptr.size - 1])
+            drawn += block
+
+        n_ptr = ptr.view(n + 1)
+        nnz_idx = (n_ptr, jklm.view(int(n_ptr[-1])))
+        yield np.arange(n, dtype=np.int32), ijk.prefix(n), nnz_idx
 
 
 def fixed_data_to_dicts(JKL, KLM):
-    JKL_dict = defaultdict(list)
-    KLM_dict = defaultdict(list)
-    for j, k, l in JKL:
-        JKL_dict[j, k].append(l)
-    for k, l, m in KLM:
-        KLM_dict[k, l].append(m)
+    # (j, k) -> [l] and (k, l) -> [m]
+    JKL_dict = PrefixIndex(JKL, (0, 1), values=2).to_dict()
+    KLM_dict = PrefixIndex(KLM, (0, 1), values=2).to_dict()
     return JKL_dict, KLM_dict
 
-def str_to_num_idx(str_idx):
-    i,j,k = str_idx
-    i = int(''.join(c for c in i if c.isdigit()))
-    j = int(''.join(c for c in j if c.isdigit()))
-    k = int(''.join(c for c in k if c.isdigit()))   
-    return i, j, k 
-
-def variable_data_to_num_tuple(IJK):
-    ijk = []
-    for x in IJK.loc[IJK["value"] == 1][["i", "j", "k"]].to_dict("split")["data"]:
-        ijk.append(tuple(str_to_num_idx(x)))
-    return ijk    
-
-def fixed_data_to_num_dicts(JKL,KLM):
-    JKL_ndict = defaultdict(list)
-    KLM_ndict = defaultdict(list)
-
-    for jkl in JKL:
-        j,k,l = str_to_num_idx(jkl)
-        JKL_ndict[j,k].append(l)
-    for klm in KLM:
-        k,l,m = str_to_num_idx(klm)
-        KLM_ndict[k,l].append(m)
-    return JKL_ndict, KLM_ndict
-
-def data_to_nnz_idx(I, IJK_numidx, JKL_ndict, KLM_ndict):
-    # The indices will be converted to 0-based indexing.
-    nnz_idx = {}
-    for i in range(len(I)):
-        jklm = []
-        for _, j, k in list(filter(lambda x:x[0]==i+1, IJK_numidx)):        
-            # 0-based indexing!!
-            jklm += [(j-1, k-1, l-1, KLM_ndict[(k, l)][0]-1) for l in JKL_ndict[(j,k)] if (k,l) in KLM_ndict]
-        if len(jklm)>0:
-            nnz_idx[i] = jklm
-    return nnz_idx
\ No newline at end of file
+
+def data_to_nnz_idx(I, J, K, L, M, ijk, jkl, klm):
+    # IJK x JKL x KLM in one pass over the 0-based integer codes. The result
+    # (ptr, jklm) is CSR-like: the x entries (j, k, l, m) of product i are the
+    # int32 rows jklm[ptr[i]:ptr[i + 1]] of the int64 offsets ptr. Runners
+    # with one x per entry and one ei row per product only need ptr.
+
+    # (j, k) -> l and (k, l) -> m
+    jk_l = PrefixIndex(jkl, (0, 1), values=2, shape=(len(J), len(K)))
+    kl_m = PrefixIndex(klm, (0, 1), values=2, shape=(len(K), len(L)))
+
+    # every (i, j, k, l), then every (i, j, k, l, m)
+    ijk = ijk[np.argsort(ijk[:, 0], kind="stable")]
+    rows, l = jk_l.join(ijk[:, 1:])
+    ijkl = np.column_stack((ijk[rows], l))
+    rows, m = kl_m.join(ijkl[:, 2:])
+    i = ijkl[rows, 0]
+    jklm = np.column_stack((ijkl[rows, 1:], m))
+
+    ptr = np.zeros(len(I) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(i, minlength=len(I)), out=ptr[1:])
+    return ptr, jklm.astype(np.int32)
+
+
+def count_model_size(I, J, K, L, ijk, jkl, klm):
+    # number of x and of ei rows (products with at least one x) counted from
+    # the set sizes alone, independent of the join in data_to_nnz_idx
+    n_k, n_l = len(K), len(L)
+    m_per_kl = np.bincount(klm[:, 0] * n_l + klm[:, 1], minlength=n_k * n_l)
+    x_per_jk = np.bincount(
+        jkl[:, 0] * n_k + jkl[:, 1],
+        weights=m_per_kl[jkl[:, 1] * n_l + jkl[:, 2]],
+        minlength=len(J) * n_k,
+    )
+    x_per_i = np.bincount(
+        ijk[:, 0], weights=x_per_jk[ijk[:, 1] * n_k + ijk[:, 2]], minlength=len(I)
+    )
+    return int(x_per_i.sum()), int(np.count_nonzero(x_per_i))
+
+
+def check_nnz_idx(I, J, K, L, ijk, jkl, klm, nnz_idx):
+    # all runners build one x per (i, j, k, l, m) and one ei row per product
+    # with at least one x, so the MOSEK Fusion model must have the same size
+    ptr, jklm = nnz_idx
+    size = (len(jklm), int(np.count_nonzero(np.diff(ptr))))
+    expected = count_model_size(I, J, K, L, ijk, jkl, klm)
+    if size != expected:
+        raise ValueError(
+            f"model size mismatch for |I|={len(I)}: {size} (variables, "
+            f"constraints) in nnz_idx, expected {expected}"
+        )
+    return expected
+
@@ -0,0 +1,72 @@
+import os
+import pandas as pd
+import numpy as np
+
+import mosek
+
+from measure import time_model, phase, model_size
+
+
+########## Direct MPS ##########
+def run_direct_mps(I, nnz_idx, solve, repeats, number):
+    ptr, _ = nnz_idx
+
+    setup = {
+        "ptr": ptr,
+        # one file per process, runs may share the data directory
+        "file": os.path.join("IJKLM", "data", f"model_{os.getpid()}.mps"),
+        "solve": solve,
+        "model_function": direct_mps,
+    }
+    try:
+        r, metrics = time_model(
+            "model_function(ptr, file, solve)",
+            setup,
+            repeats=repeats,
+            number=number,
+        )
+    finally:
+        if os.path.exists(setup["file"]):
+            os.remove(setup["file"])
+
+    result = pd.DataFrame(
+        {
+            "I": [len(I)],
+            "Language": ["Direct MPS"],
+            "MinTime": [np.min(r)],
+            "MeanTime": [np.mean(r)],
+            "MedianTime": [np.median(r)],
+            **metrics,
+        }
+    )
+    return result
+
+
+def direct_mps(ptr, file, solve, chunk_size=2**16):
+    # free MPS straight from the CSR offsets: column x{c} has a 1 in row ei{i}
+    # for ptr[i] <= c < ptr[i + 1]. The constant objective is left out and x
+    # keeps the default bounds [0, inf). At most chunk_size lines are held
+    # in memory at once.
+    rows = np.flatnonzero(np.diff(ptr))
+
+    with phase("Handoff"), open(file, "w") as f:
+        f.write("NAME IJKLM\nROWS\n N obj\n")
+        for start in range(0, len(rows), chunk_size):
+            chunk = rows[start : start + chunk_size].tolist()
+            f.write("".join(map(" G ei{}\n".format, chunk)))
+
+        f.write("COLUMNS\n")
+        for start in range(0, int(ptr[-1]), chunk_size):
+            cols = np.arange(start, min(start + chunk_size, int(ptr[-1])))
+            row = np.searchsorted(ptr, cols, side="right") - 1
+            f.write("".join(map(" x{} ei{} 1\n".format, cols.tolist(), row.tolist())))
+
+        f.write("RHS\nENDATA\n")
+
+    model_size(int(ptr[-1]), len(rows))
+
+    if solve:
+        with phase("Solve"), mosek.Task() as task:
+            task.readdata(file)
+            task.putdouparam(mosek.dparam.optimizer_max_time, 0.0)
+            task.optimize()
@@ -3,30 +3,33 @@ import subprocess
 import pandas as pd
 import numpy as np
 
+from gdx_export import GdxExport
 
-########## GAMS ##########
-def data_to_gams(I, J, K, L, M, ijk, jkl, klm):
-    c = gt.Container()
 
-    # create sets
-    i = c.addSet("i", records=I)
-    j = c.addSet("j", records=J)
-    k = c.addSet("k", records=K)
-    l = c.addSet("l", records=L)
-    m = c.addSet("m", records=M)
+########## GAMS ##########
+def gams_export(J, K, L, M, jkl, klm):
+    # one container for the sweep, data_to_gams only adds the products
+    export = GdxExport("IJKLM/data/data.gdx")
+    for name, S in zip("ijklm", ([], J, K, L, M)):
+        export.set_domain(name, len(S))
 
-    c.addSet("IJK", [i, j, k], records=ijk[ijk["value"] == 1])
-    c.addSet("JKL", [j, k, l], records=jkl[jkl["value"] == 1])
-    c.addSet("KLM", [k, l, m], records=klm[klm["value"] == 1])
+    export.set_records("JKL", ["j", "k", "l"], jkl)
+    export.set_records("KLM", ["k", "l", "m"], klm)
 
     # create parameter
+    c = export.container
     c.addParameter("time")
 
     # create variables
     c.addVariable("z")
-    c.addVariable("x", domain=[i, j, k, l, m])
+    c.addVariable("x", domain=[c["i"], c["j"], c["k"], c["l"], c["m"]])
+    return export
+
 
-    c.write("IJKLM/data/data.gdx")
+def data_to_gams(export, I, ijk):
+    export.set_domain("i", len(I))
+    export.set_records("IJK", ["i", "j", "k"], ijk)
+    export.write()
 
 
 def run_gams(solve, N, repeats, number):
@@ -54,6 +57,8 @@ def run_gams(solve, N, repeats, number):
             "MinTime": [np.min(r)],
             "MeanTime": [np.mean(r)],
             "MedianTime": [np.median(r)],
+            "Variables": [int(c["vars"].toValue())],
+            "Constraints": [int(c["equs"].toValue())],
         }
     )
 
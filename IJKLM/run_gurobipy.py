@@ -1,31 +1,33 @@
-import timeit
 import pandas as pd
 import numpy as np
+import scipy.sparse as sp
 import gurobipy as gpy
-import itertools
-import operator
+
+from IJKLM.data_generation import as_tuples
+from sparse_index import PrefixIndex
+from measure import time_model, time_step, model_size
 
 
 ########## Gurobi ##########
 def run_gurobi(I, ijk, jkl, klm, solve, repeats, number):
     # convert sets to tuplelists
-    IJK = gpy.tuplelist(ijk)
-    JKL = gpy.tuplelist(jkl)
-    KLM = gpy.tuplelist(klm)
+    IJK = gpy.tuplelist(as_tuples(ijk))
+    JKL = gpy.tuplelist(as_tuples(jkl))
+    KLM = gpy.tuplelist(as_tuples(klm))
 
     setup = {
-        "I": I,
+        "I": as_tuples(I),
         "IJK": IJK,
         "JKL": JKL,
         "KLM": KLM,
         "solve": solve,
         "model_function": gurobi,
     }
-    r = timeit.repeat(
+    r, metrics = time_model(
         "model_function(I, IJK, JKL, KLM, solve)",
-        repeat=repeats,
+        setup,
+        repeats=repeats,
         number=number,
-        globals=setup,
     )
 
     result = pd.DataFrame(
@@ -35,6 +37,7 @@ def run_gurobi(I, ijk, jkl, klm, solve, repeats, number):
             "MinTime": [np.min(r)],
             "MeanTime": [np.mean(r)],
             "MedianTime": [np.median(r)],
+            **metrics,
         }
     )
     return result
@@ -64,38 +67,42 @@ def gurobi(I, IJK, JKL, KLM, solve):
             )
             >= 0
             for i in I
+            if x.select(i, "*", "*", "*", "*")
         ),
         "ei",
     )
 
     model.update()
+    model_size(model.NumVars, model.NumConstrs)
 
     if solve:
         model.Params.OutputFlag = 0
         model.Params.TimeLimit = 0
         model.optimize()
 
+    return model
+
 
 ########## Fast Gurobi ##########
 def run_fast_gurobi(I, ijk, jkl, klm, solve, repeats, number):
     # convert sets to tuplelists
-    IJK = gpy.tuplelist(ijk)
-    JKL = gpy.tuplelist(jkl)
-    KLM = gpy.tuplelist(klm)
+    IJK = gpy.tuplelist(as_tuples(ijk))
+    JKL = gpy.tuplelist(as_tuples(jkl))
+    KLM = gpy.tuplelist(as_tuples(klm))
 
     setup = {
-        "I": I,
+        "I": as_tuples(I),
         "IJK": IJK,
         "JKL": JKL,
         "KLM": KLM,
         "solve": solve,
         "model_function": fast_gurobi,
     }
-    r = timeit.repeat(
+    r, metrics = time_model(
         "model_function(I, IJK, JKL, KLM, solve)",
-        repeat=repeats,
+        setup,
+        repeats=repeats,
         number=number,
-        globals=setup,
     )
 
     result = pd.DataFrame(
@@ -105,6 +112,7 @@ def run_fast_gurobi(I, ijk, jkl, klm, solve, repeats, number):
             "MinTime": [np.min(r)],
             "MeanTime": [np.mean(r)],
             "MedianTime": [np.median(r)],
+            **metrics,
         }
     )
     return result
@@ -122,24 +130,143 @@ def fast_gurobi(I, IJK, JKL, KLM, solve):
 
     x = model.addVars(x_list, name="x")
 
-    constraint_dict_i = {i: [] for i in I}
-    constraint_dict_i.update(
+    constraint_dict_i = PrefixIndex(x_list, (0,), keys=I)
+
+    model.setObjective(1, gpy.GRB.MINIMIZE)
+
+    model.addConstrs(
+        (
+            gpy.quicksum(x[ijklm] for ijklm in constraint_dict_i[i]) >= 0
+            for i in I
+            if constraint_dict_i[i]
+        ),
+        "ei",
+    )
+
+    model.update()
+    model_size(model.NumVars, model.NumConstrs)
+
+    if solve:
+        model.Params.OutputFlag = 0
+        model.Params.TimeLimit = 0
+        model.optimize()
+
+    return model
+
+
+########## Matrix Gurobi ##########
+def run_matrix_gurobi(I, nnz_idx, solve, repeats, number):
+    ptr, _ = nnz_idx
+
+    setup = {
+        "ptr": ptr,
+        "solve": solve,
+        "model_function": matrix_gurobi,
+    }
+    r, metrics = time_model(
+        "model_function(ptr, solve)",
+        setup,
+        repeats=repeats,
+        number=number,
+    )
+
+    result = pd.DataFrame(
         {
-            i: list(j)
-            for i, j in itertools.groupby(sorted(x_list), operator.itemgetter(0))
+            "I": [len(I)],
+            "Language": ["Matrix GurobiPy"],
+            "MinTime": [np.min(r)],
+            "MeanTime": [np.mean(r)],
+            "MedianTime": [np.median(r)],
+            **metrics,
         }
     )
+    return result
+
+
+def matrix_gurobi(ptr, solve):
+    model = gpy.Model()
+
+    nnz = int(ptr[-1])
+    x = model.addMVar(nnz, name="x")
 
     model.setObjective(1, gpy.GRB.MINIMIZE)
 
-    model.addConstrs(
-        (gpy.quicksum(x[ijklm] for ijklm in constraint_dict_i[i]) >= 0 for i in I),
-        "ei",
+    # one row per product with at least one x, x is in product order so the
+    # rows of A are the nonempty rows of ptr
+    nonempty = np.flatnonzero(np.diff(ptr))
+    indptr = np.append(ptr[nonempty], nnz)
+    A = sp.csr_matrix(
+        (np.ones(nnz), np.arange(nnz), indptr), shape=(len(nonempty), nnz)
     )
+    model.addMConstr(A, x, ">", np.zeros(len(nonempty)))
 
     model.update()
+    model_size(model.NumVars, model.NumConstrs)
 
     if solve:
         model.Params.OutputFlag = 0
         model.Params.TimeLimit = 0
         model.optimize()
+
+    return model
+
+
+########## Incremental Matrix Gurobi ##########
+def run_incremental_gurobi(state, I, nnz_idx, solve, repeats, number):
+    # adds the products new since the last n to the matrix model in state
+    ptr, _ = nnz_idx
+    added = len(I) - state.get("n", 0)
+
+    setup = {
+        "state": state,
+        "ptr": ptr,
+        "solve": solve,
+        "model_function": extend_matrix_gurobi,
+    }
+    r, metrics = time_step("model_function(state, ptr, solve)", setup)
+
+    result = pd.DataFrame(
+        {
+            "I": [len(I)],
+            "Language": ["Incremental Matrix GurobiPy"],
+            "MinTime": [np.min(r)],
+            "MeanTime": [np.mean(r)],
+            "MedianTime": [np.median(r)],
+            "MarginalTime": [np.min(r) / added if added else np.nan],
+            **metrics,
+        }
+    )
+    return result
+
+
+def extend_matrix_gurobi(state, ptr, solve):
+    # the model of matrix_gurobi for the products state["n"], ..., len(ptr) - 2
+    # added to the model in state, which is created on the first call
+    if "model" not in state:
+        model = gpy.Model()
+        model.setObjective(1, gpy.GRB.MINIMIZE)
+        model.Params.OutputFlag = 0
+        model.Params.TimeLimit = 0
+        state.update(model=model, n=0)
+    model, known, n = state["model"], state["n"], len(ptr) - 1
+
+    first = int(ptr[known])
+    nnz = int(ptr[n]) - first
+    x = model.addMVar(nnz, name=f"x_{known}")
+
+    rows = ptr[known : n + 1] - first
+    nonempty = np.flatnonzero(np.diff(rows))
+    indptr = np.append(rows[nonempty], nnz)
+    A = sp.csr_matrix(
+        (np.ones(nnz), np.arange(nnz), indptr), shape=(len(nonempty), nnz)
+    )
+    model.addMConstr(A, x, ">", np.zeros(len(nonempty)))
+
+    model.update()
+    model_size(model.NumVars, model.NumConstrs)
+
+    if solve:
+        model.optimize()
+
+    state["n"] = n
+    return model
@@ -1,13 +1,15 @@
 import subprocess
 import json
 import pandas as pd
+import numpy as np
 import os
 
 
 ########## JuMP ##########
-def run_julia(solve, repeats, number, time_limit):
+def run_julia(solve, repeats, number, time_limit, exchange="bin"):
+    # exchange is the format of the data files, "bin" or "json"
     subprocess.call(
-        f"julia IJKLM/IJKLM.jl {solve} {repeats} {number} {time_limit}"
+        f"julia IJKLM/IJKLM.jl {solve} {repeats} {number} {time_limit} {exchange}"
     )
     print("\nJulia done")
 
@@ -28,3 +30,50 @@ def run_julia(solve, repeats, number, time_limit):
     with open(file2, "r") as f:
         df2 = pd.DataFrame(json.load(f))
     return df, df2
+
+
+########## JuMP worker ##########
+def run_jump(
+    worker, framework, N, solve, repeats, number, exchange="bin", timeout=None
+):
+    # one run of framework at |I| = N in the persistent JuliaWorker of
+    # IJKLM/IJKLM.jl, framework is "JuMP" or "Fast JuMP"
+    reply = worker.run(
+        {
+            "language": framework,
+            "n": N,
+            "solve": solve,
+            "repeats": repeats,
+            "number": number,
+            "exchange": exchange,
+        },
+        timeout=timeout,
+    )
+    return jump_result(framework, N, reply)
+
+
+def jump_result(language, n, reply):
+    if reply is None:
+        return pd.DataFrame(
+            {
+                "I": [n],
+                "Language": [language],
+                "MinTime": [np.nan],
+                "MeanTime": [np.nan],
+                "MedianTime": [np.nan],
+                "Status": ["timed out"],
+            }
+        )
+
+    r = reply["times"]
+    return pd.DataFrame(
+        {
+            "I": [n],
+            "Language": [language],
+            "MinTime": [np.min(r)],
+            "MeanTime": [np.mean(r)],
+            "MedianTime": [np.median(r)],
+            "Variables": [reply["variables"]],
+            "Constraints": [reply["constraints"]],
+        }
+    )
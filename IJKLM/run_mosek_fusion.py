@@ -1,32 +1,26 @@
-import timeit 
-import logging
 import pandas as pd
 import numpy as np
-from collections import defaultdict
-
-import sys
 
 import mosek.fusion as msk
 
+from measure import time_model, phase, model_size
+
 ########## MOSEK Fusion ##########
 
 def run_mosek_fusion(I, J, K, L, M, nnz_idx, solve, repeats, number):
-    total_len = 0
-    for i in nnz_idx.keys():
-        total_len+=len(nnz_idx[i])
+    ptr, _ = nnz_idx
 
     setup = {
-        "total_len":total_len,
-        "nnz_idx":nnz_idx,
+        "ptr": ptr,
         "solve": solve,
         "model_function": mosek_fusion,
     }
 
-    r = timeit.repeat(
-        "model_function(total_len, nnz_idx, solve)",
-        repeat=repeats,
+    r, metrics = time_model(
+        "model_function(ptr, solve)",
+        setup,
+        repeats=repeats,
         number=number,
-        globals=setup,
     )
 
 
@@ -37,29 +31,96 @@ def run_mosek_fusion(I, J, K, L, M, nnz_idx, solve, repeats, number):
             "MinTime": [np.min(r)],
             "MeanTime": [np.mean(r)],
             "MedianTime": [np.median(r)],
+            **metrics,
+        }
+    )
+    return result
+
+def mosek_fusion(ptr, solve):
+    model = msk.Model()
+
+    with phase("Variables"):
+        model.objective(msk.ObjectiveSense.Minimize, 1.0)
+
+        x = model.variable(int(ptr[-1]), msk.Domain.greaterThan(0.0))
+
+    with phase("Constraints"):
+        c_e = []
+        for start, stop in zip(ptr[:-1].tolist(), ptr[1:].tolist()):
+            if stop > start:
+                c_e.append(msk.Expr.sum(x.slice(start, stop)))
+        c_e = msk.Expr.vstack(c_e)
+
+        model.constraint(c_e, msk.Domain.greaterThan(0.0))
+
+    model_size(x.getSize(), c_e.getShape()[0])
+
+    if solve:
+        with phase("Solve"):
+            model.setSolverParam("optimizerMaxTime", 0.0)
+            model.setSolverParam("log", 0)
+            model.solve()
+
+    return model
+
+
+########## MOSEK Fusion (matrix) ##########
+def run_mosek_fusion_matrix(I, J, K, L, M, nnz_idx, solve, repeats, number):
+    # same model as run_mosek_fusion, built from the CSR offsets in one matrix
+    ptr, _ = nnz_idx
+
+    setup = {
+        "ptr": ptr,
+        "solve": solve,
+        "model_function": mosek_fusion_matrix,
+    }
+
+    r, metrics = time_model(
+        "model_function(ptr, solve)",
+        setup,
+        repeats=repeats,
+        number=number,
+    )
+
+    result = pd.DataFrame(
+        {
+            "I": [len(I)],
+            "Language": ["MOSEK Fusion (matrix)"],
+            "MinTime": [np.min(r)],
+            "MeanTime": [np.mean(r)],
+            "MedianTime": [np.median(r)],
+            **metrics,
         }
     )
     return result
 
-def mosek_fusion(total_len, nnz_idx, solve):
+
+def mosek_fusion_matrix(ptr, solve):
     model = msk.Model()
 
-    model.objective(msk.ObjectiveSense.Minimize, 1.0)
+    with phase("Variables"):
+        model.objective(msk.ObjectiveSense.Minimize, 1.0)
 
-    x = model.variable(total_len, msk.Domain.greaterThan(0.0))
+        nnz = int(ptr[-1])
+        x = model.variable(nnz, msk.Domain.greaterThan(0.0))
 
-    c_e = []
-    count = 0
-    for i in nnz_idx.keys():
-        size = len(nnz_idx[i])
-        c_e.append(msk.Expr.sum(x.slice(count, count+size)))
-        count += size
-    c_e = msk.Expr.vstack(c_e)
+    with phase("Constraints"):
+        # one row per product with at least one x, x is in product order so
+        # the row of x[p] follows from the row lengths alone
+        counts = np.diff(ptr)
+        counts = counts[counts > 0]
+        rows = np.repeat(np.arange(len(counts), dtype=np.int32), counts)
+        cols = np.arange(nnz, dtype=np.int32)
+        A = msk.Matrix.sparse(len(counts), nnz, rows, cols, np.ones(nnz))
 
-    model.constraint(c_e, msk.Domain.greaterThan(0.0))
+        model.constraint(msk.Expr.mul(A, x), msk.Domain.greaterThan(0.0))
+
+    model_size(nnz, len(counts))
 
     if solve:
-        model.setSolverParam("optimizerMaxTime", 0.0)
-        model.setSolverParam("log", 0)
-        model.solve()
-        
\ No newline at end of file
+        with phase("Solve"):
+            model.setSolverParam("optimizerMaxTime", 0.0)
+            model.setSolverParam("log", 0)
+            model.solve()
+
+    return model
@@ -1,9 +1,12 @@
 import pyomo.environ as pyo
+import pyomo.kernel as pmo
 import logging
-import timeit
 import pandas as pd
 import numpy as np
-import itertools, operator
+
+from IJKLM.data_generation import as_tuples, fixed_data_to_dicts
+from sparse_index import PrefixIndex
+from measure import time_model, time_step, phase, model_size
 
 logging.getLogger("pyomo.core").setLevel(logging.ERROR)
 
@@ -11,18 +14,18 @@ logging.getLogger("pyomo.core").setLevel(logging.ERROR)
 ########## Pyomo ##########
 def run_pyomo(I, IJK, JKL, KLM, solve, repeats, number):
     setup = {
-        "I": I,
-        "IJK": IJK,
-        "JKL": JKL,
-        "KLM": KLM,
+        "I": as_tuples(I),
+        "IJK": as_tuples(IJK),
+        "JKL": as_tuples(JKL),
+        "KLM": as_tuples(KLM),
         "solve": solve,
         "model_function": pyomo,
     }
-    r = timeit.repeat(
+    r, metrics = time_model(
         "model_function(I, IJK, JKL, KLM, solve)",
-        repeat=repeats,
+        setup,
+        repeats=repeats,
         number=number,
-        globals=setup,
     )
 
     result = pd.DataFrame(
@@ -32,6 +35,7 @@ def run_pyomo(I, IJK, JKL, KLM, solve, repeats, number):
             "MinTime": [np.min(r)],
             "MeanTime": [np.mean(r)],
             "MedianTime": [np.median(r)],
+            **metrics,
         }
     )
     return result
@@ -40,33 +44,42 @@ def run_pyomo(I, IJK, JKL, KLM, solve, repeats, number):
 def pyomo(I, IJK, JKL, KLM, solve):
     model = pyo.ConcreteModel()
 
-    model.I = pyo.Set(initialize=I)
-    model.IJK = pyo.Set(initialize=IJK)
-    model.JKL = pyo.Set(initialize=JKL)
-    model.KLM = pyo.Set(initialize=KLM)
+    with phase("Sets"):
+        model.I = pyo.Set(initialize=I)
+        model.IJK = pyo.Set(initialize=IJK)
+        model.JKL = pyo.Set(initialize=JKL)
+        model.KLM = pyo.Set(initialize=KLM)
 
-    model.z = pyo.Param(default=1)
+        model.z = pyo.Param(default=1)
 
-    model.x = pyo.Var(
-        [
-            (i, j, k, l, m)
-            for (i, j, k) in model.IJK
-            for (jj, kk, l) in model.JKL
-            if (jj == j) and (kk == k)
-            for (kkk, ll, m) in model.KLM
-            if (kkk == k) and (ll == l)
-        ],
-        domain=pyo.NonNegativeReals,
-    )
+    with phase("Variables"):
+        model.x = pyo.Var(
+            [
+                (i, j, k, l, m)
+                for (i, j, k) in model.IJK
+                for (jj, kk, l) in model.JKL
+                if (jj == j) and (kk == k)
+                for (kkk, ll, m) in model.KLM
+                if (kkk == k) and (ll == l)
+            ],
+            domain=pyo.NonNegativeReals,
+        )
 
-    model.OBJ = pyo.Objective(expr=model.z)
+    with phase("Constraints"):
+        model.OBJ = pyo.Objective(expr=model.z)
 
-    model.ei = pyo.Constraint(model.I, rule=ei_rule)
+        model.ei = pyo.Constraint(model.I, rule=ei_rule)
 
+    model_size(len(model.x), len(model.ei))
+
+    # the solver interface translates the model and solves in one call
     if solve:
-        opt = pyo.SolverFactory("mosek")
-        opt.solve(model, options = {'dparam.optimizer_max_time':  0.0, 
-                                   'iparam.log':   0}, load_solutions=False)
+        with phase("Solve"):
+            opt = pyo.SolverFactory("mosek")
+            opt.solve(model, options = {'dparam.optimizer_max_time':  0.0, 
+                                       'iparam.log':   0}, load_solutions=False)
+
+    return model
 
 
 def ei_rule(model, i):
@@ -79,7 +92,7 @@ def ei_rule(model, i):
         for (kkk, ll, m) in model.KLM
         if (kkk == k) and (ll == l)
     ]
-    if len(lhs) < 2:
+    if not lhs:
         return pyo.Constraint.Skip
     else:
         return sum(lhs) >= 0
@@ -87,19 +100,23 @@ def ei_rule(model, i):
 
 ########## Fast Pyomo ##########
 def run_fast_pyomo(I, IJK, JKL, KLM, solve, repeats, number):
+    # JKL and KLM are either the lookup dicts or integer coded arrays
+    if isinstance(JKL, np.ndarray):
+        JKL, KLM = fixed_data_to_dicts(as_tuples(JKL), as_tuples(KLM))
+
     setup = {
-        "I": I,
-        "IJK": IJK,
+        "I": as_tuples(I),
+        "IJK": as_tuples(IJK),
         "JKL": JKL,
         "KLM": KLM,
         "solve": solve,
         "model_function": fast_pyomo,
     }
-    r = timeit.repeat(
+    r, metrics = time_model(
         "model_function(I, IJK, JKL, KLM, solve)",
-        repeat=repeats,
+        setup,
+        repeats=repeats,
         number=number,
-        globals=setup,
     )
 
     result = pd.DataFrame(
@@ -109,6 +126,7 @@ def run_fast_pyomo(I, IJK, JKL, KLM, solve, repeats, number):
             "MinTime": [np.min(r)],
             "MeanTime": [np.mean(r)],
             "MedianTime": [np.median(r)],
+            **metrics,
         }
     )
     return result
@@ -117,35 +135,41 @@ def run_fast_pyomo(I, IJK, JKL, KLM, solve, repeats, number):
 def fast_pyomo(I, IJK, JKL, KLM, solve):
     model = pyo.ConcreteModel()
 
-    model.I = pyo.Set(initialize=I)
+    with phase("Data"):
+        x_list = [
+            (i, j, k, l, m)
+            for (i, j, k) in IJK
+            for l in JKL[j, k]
+            for m in KLM[k, l]
+        ]
 
-    x_list = [
-        (i, j, k, l, m) for (i, j, k) in IJK for l in JKL[j, k] for m in KLM[k, l]
-    ]
+        constraint_dict_i = PrefixIndex(x_list, (0,), keys=I).to_dict()
 
-    constraint_dict_i = {i: [] for i in I}
-    constraint_dict_i.update(
-        {
-            i: list(j)
-            for i, j in itertools.groupby(sorted(x_list), operator.itemgetter(0))
-        }
-    )
+    with phase("Sets"):
+        model.I = pyo.Set(initialize=I)
+        model.x_list = pyo.Set(initialize=x_list)
+        model.c_dict_i = pyo.Set(model.I, initialize=constraint_dict_i)
 
-    model.x_list = pyo.Set(initialize=x_list)
-    model.c_dict_i = pyo.Set(model.I, initialize=constraint_dict_i)
+        model.z = pyo.Param(default=1)
 
-    model.z = pyo.Param(default=1)
+    with phase("Variables"):
+        model.x = pyo.Var(model.x_list, domain=pyo.NonNegativeReals)
 
-    model.x = pyo.Var(model.x_list, domain=pyo.NonNegativeReals)
+    with phase("Constraints"):
+        model.OBJ = pyo.Objective(expr=model.z)
 
-    model.OBJ = pyo.Objective(expr=model.z)
+        model.ei = pyo.Constraint(model.I, rule=fast_ei_rule)
 
-    model.ei = pyo.Constraint(model.I, rule=fast_ei_rule)
+    model_size(len(model.x), len(model.ei))
 
+    # the solver interface translates the model and solves in one call
     if solve:
-        opt = pyo.SolverFactory("mosek")
-        opt.solve(model, options = {'dparam.optimizer_max_time':  0.0, 
-                                   'iparam.log':   0}, load_solutions=False)
+        with phase("Solve"):
+            opt = pyo.SolverFactory("mosek")
+            opt.solve(model, options = {'dparam.optimizer_max_time':  0.0, 
+                                       'iparam.log':   0}, load_solutions=False)
+
+    return model
 
 
 def fast_ei_rule(model, i):
@@ -154,25 +178,261 @@ def fast_ei_rule(model, i):
     return sum(model.x[idx] for idx in model.c_dict_i[i]) >= 0
 
 
+########## Indexed Pyomo ##########
+def run_indexed_pyomo(I, IJK, JKL, KLM, solve, repeats, number):
+    setup = {
+        "I": as_tuples(I),
+        "IJK": as_tuples(IJK),
+        "JKL": as_tuples(JKL),
+        "KLM": as_tuples(KLM),
+        "solve": solve,
+        "model_function": indexed_pyomo,
+    }
+    r, metrics = time_model(
+        "model_function(I, IJK, JKL, KLM, solve)",
+        setup,
+        repeats=repeats,
+        number=number,
+    )
+
+    result = pd.DataFrame(
+        {
+            "I": [len(I)],
+            "Language": ["Indexed Pyomo"],
+            "MinTime": [np.min(r)],
+            "MeanTime": [np.mean(r)],
+            "MedianTime": [np.median(r)],
+            **metrics,
+        }
+    )
+    return result
+
+
+def indexed_pyomo(I, IJK, JKL, KLM, solve):
+    model = pyo.ConcreteModel()
+
+    with phase("Sets"):
+        model.I = pyo.Set(initialize=I)
+        model.IJK = pyo.Set(initialize=IJK)
+        model.JKL = pyo.Set(initialize=JKL)
+        model.KLM = pyo.Set(initialize=KLM)
+
+        model.z = pyo.Param(default=1)
+
+    # the same filters as pyomo(), looked up by their leading keys instead of
+    # scanning the whole set. Built once, shared by x and the constraints.
+    with phase("Data"):
+        model.IJK_index = PrefixIndex(model.IJK, (0,))
+        model.JKL_index = PrefixIndex(model.JKL, (0, 1))
+        model.KLM_index = PrefixIndex(model.KLM, (0, 1))
+
+    with phase("Variables"):
+        model.x = pyo.Var(
+            [
+                (i, j, k, l, m)
+                for (i, j, k) in model.IJK
+                for (jj, kk, l) in model.JKL_index[j, k]
+                for (kkk, ll, m) in model.KLM_index[k, l]
+            ],
+            domain=pyo.NonNegativeReals,
+        )
+
+    with phase("Constraints"):
+        model.OBJ = pyo.Objective(expr=model.z)
+
+        model.ei = pyo.Constraint(model.I, rule=indexed_ei_rule)
+
+    model_size(len(model.x), len(model.ei))
+
+    # the solver interface translates the model and solves in one call
+    if solve:
+        with phase("Solve"):
+            opt = pyo.SolverFactory("mosek")
+            opt.solve(model, options = {'dparam.optimizer_max_time':  0.0, 
+                                       'iparam.log':   0}, load_solutions=False)
+
+    return model
+
+
+def indexed_ei_rule(model, i):
+    lhs = [
+        model.x[i, j, k, l, m]
+        for (ii, j, k) in model.IJK_index[i]
+        for (jj, kk, l) in model.JKL_index[j, k]
+        for (kkk, ll, m) in model.KLM_index[k, l]
+    ]
+    if not lhs:
+        return pyo.Constraint.Skip
+    else:
+        return sum(lhs) >= 0
+
+
+########## Kernel Pyomo ##########
+def run_kernel_pyomo(I, nnz_idx, solve, repeats, number):
+    ptr, _ = nnz_idx
+
+    setup = {
+        "ptr": ptr,
+        "solve": solve,
+        "model_function": kernel_pyomo,
+    }
+    r, metrics = time_model(
+        "model_function(ptr, solve)",
+        setup,
+        repeats=repeats,
+        number=number,
+    )
+
+    result = pd.DataFrame(
+        {
+            "I": [len(I)],
+            "Language": ["Kernel Pyomo"],
+            "MinTime": [np.min(r)],
+            "MeanTime": [np.mean(r)],
+            "MedianTime": [np.median(r)],
+            **metrics,
+        }
+    )
+    return result
+
+
+def kernel_pyomo(ptr, solve):
+    model = pmo.block()
+
+    with phase("Variables"):
+        nnz = int(ptr[-1])
+        model.x = pmo.variable_list(pmo.variable(lb=0) for _ in range(nnz))
+
+    with phase("Constraints"):
+        model.OBJ = pmo.objective(1)
+
+        # one linear constraint per product with at least one x, the terms
+        # are kept as lists and no expression tree is built
+        x, ones, ptr = list(model.x), [1.0] * nnz, ptr.tolist()
+        model.ei = pmo.constraint_list(
+            pmo.linear_constraint(
+                variables=x[start:stop], coefficients=ones[start:stop], lb=0
+            )
+            for start, stop in zip(ptr[:-1], ptr[1:])
+            if stop > start
+        )
+
+    model_size(len(model.x), len(model.ei))
+
+    # the persistent solver translates the model once, the solve does not
+    # walk it again
+    if solve:
+        with phase("Handoff"):
+            opt = pyo.SolverFactory("mosek_persistent")
+            opt.set_instance(model)
+
+        with phase("Solve"):
+            opt.solve(
+                options={"dparam.optimizer_max_time": 0.0, "iparam.log": 0},
+                load_solutions=False,
+            )
+
+    return model
+
+
+########## Incremental Kernel Pyomo ##########
+def run_incremental_kernel_pyomo(state, I, nnz_idx, solve, repeats, number):
+    # adds the products new since the last n to the kernel model in state
+    ptr, _ = nnz_idx
+    added = len(I) - state.get("n", 0)
+
+    setup = {
+        "state": state,
+        "ptr": ptr,
+        "solve": solve,
+        "model_function": extend_kernel_pyomo,
+    }
+    r, metrics = time_step("model_function(state, ptr, solve)", setup)
+
+    result = pd.DataFrame(
+        {
+            "I": [len(I)],
+            "Language": ["Incremental Kernel Pyomo"],
+            "MinTime": [np.min(r)],
+            "MeanTime": [np.mean(r)],
+            "MedianTime": [np.median(r)],
+            "MarginalTime": [np.min(r) / added if added else np.nan],
+            **metrics,
+        }
+    )
+    return result
+
+
+def extend_kernel_pyomo(state, ptr, solve):
+    # the model of kernel_pyomo for the products state["n"], ..., len(ptr) - 2
+    # added to the model in state, which is created on the first call
+    if "model" not in state:
+        model = pmo.block()
+        model.x = pmo.variable_list()
+        model.ei = pmo.constraint_list()
+        model.OBJ = pmo.objective(1)
+        state.update(model=model, n=0)
+    model, known, n = state["model"], state["n"], len(ptr) - 1
+
+    with phase("Variables"):
+        first = int(ptr[known])
+        x = [pmo.variable(lb=0) for _ in range(int(ptr[n]) - first)]
+        model.x.extend(x)
+
+    with phase("Constraints"):
+        ones, rows = [1.0] * len(x), (ptr[known : n + 1] - first).tolist()
+        ei = [
+            pmo.linear_constraint(
+                variables=x[start:stop], coefficients=ones[start:stop], lb=0
+            )
+            for start, stop in zip(rows[:-1], rows[1:])
+            if stop > start
+        ]
+        model.ei.extend(ei)
+
+    model_size(len(model.x), len(model.ei))
+
+    # the persistent solver gets the whole model once, then only the additions
+    if solve:
+        with phase("Handoff"):
+            if "opt" not in state:
+                state["opt"] = pyo.SolverFactory("mosek_persistent")
+                state["opt"].set_instance(model)
+            else:
+                for v in x:
+                    state["opt"].add_var(v)
+                for c in ei:
+                    state["opt"].add_constraint(c)
+
+        with phase("Solve"):
+            state["opt"].solve(
+                options={"dparam.optimizer_max_time": 0.0, "iparam.log": 0},
+                load_solutions=False,
+            )
+
+    state["n"] = n
+    return model
+
+
 ########## Cartesian Pyomo ##########
 def run_cartesian_pyomo(I, J, K, L, M, IJK, JKL, KLM, solve, repeats, number):
     setup = {
-        "I": I,
-        "J": J,
-        "K": K,
-        "L": L,
-        "M": M,
-        "IJK": IJK,
-        "JKL": JKL,
-        "KLM": KLM,
+        "I": as_tuples(I),
+        "J": as_tuples(J),
+        "K": as_tuples(K),
+        "L": as_tuples(L),
+        "M": as_tuples(M),
+        "IJK": as_tuples(IJK),
+        "JKL": as_tuples(JKL),
+        "KLM": as_tuples(KLM),
         "solve": solve,
         "model_function": cartesian_pyomo,
     }
-    r = timeit.repeat(
+    r, metrics = time_model(
         "model_function(I, J, K, L, M, IJK, JKL, KLM, solve)",
-        repeat=repeats,
+        setup,
+        repeats=repeats,
         number=number,
-        globals=setup,
     )
 
     result = pd.DataFrame(
@@ -182,6 +442,7 @@ def run_cartesian_pyomo(I, J, K, L, M, IJK, JKL, KLM, solve, repeats, number):
             "MinTime": [np.min(r)],
             "MeanTime": [np.mean(r)],
             "MedianTime": [np.median(r)],
+            **metrics,
         }
     )
     return result
@@ -218,3 +479,5 @@ def cartesian_pyomo(I, J, K, L, M, IJK, JKL, KLM, solve):
         opt = pyo.SolverFactory("mosek")
         opt.solve(model, options = {'dparam.optimizer_max_time':  0.0, 
                                    'iparam.log':   0}, load_solutions=False)
+
+    return model
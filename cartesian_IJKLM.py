@@ -30,23 +30,21 @@ def run_experiment(
     # define the x axis
     N = list(incremental_range(5, cardinality_of_i + 1, 5, 5))
 
-    # create fixed data and convert to tuples and dicts
-    J, K, L, M, JKL, KLM = data.create_fixed_data(m=cardinality_of_j)
-    jkl_tuple, klm_tuple = data.fixed_data_to_tuples(JKL=JKL, KLM=KLM)
+    # create integer coded fixed data
+    J, K, L, M, jkl, klm = data.create_fixed_num_data(m=cardinality_of_j)
 
     # run experiment for every n in |I|
     for n in N:
-        # create variable data and convert to tuples
-        I, IJK = data.create_variable_data(n=n, j=J, k=K)
-        ijk_tuple = data.variable_data_to_tuples(IJK=IJK)
+        # create integer coded variable data
+        I, ijk = data.create_sparse_variable_data(n=n, j=J, k=K)
 
         # Pyomo
         if below_time_limit(df_pyomo, time_limit):
             rr = run_pyomo(
                 I=I,
-                IJK=ijk_tuple,
-                JKL=jkl_tuple,
-                KLM=klm_tuple,
+                IJK=ijk,
+                JKL=jkl,
+                KLM=klm,
                 solve=solve,
                 repeats=repeats,
                 number=number,
@@ -62,9 +60,9 @@ def run_experiment(
                 K=K,
                 L=L,
                 M=M,
-                IJK=ijk_tuple,
-                JKL=jkl_tuple,
-                KLM=klm_tuple,
+                IJK=ijk,
+                JKL=jkl,
+                KLM=klm,
                 solve=solve,
                 repeats=repeats,
                 number=number,
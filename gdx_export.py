@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+import gams.transfer as gt
+
+from sparse_index import label_table
+
+
+########## GDX export ##########
+class GdxExport:
+    # One gams.transfer Container for a whole sweep. The sets are integer
+    # coded arrays and their records categoricals on one label table (the
+    # UELs) per domain, so no label string is built per row. A domain table
+    # grows by doubling, the labels of earlier codes are never rebuilt and
+    # every n only adds the labels of its new products.
+    def __init__(self, file):
+        self.file = file
+        self.container = gt.Container()
+        self.dtypes = {}
+
+    def dtype(self, domain, size):
+        # categories domain1, domain2, ... of at least the first size codes
+        dtype = self.dtypes.get(domain)
+        known = 0 if dtype is None else len(dtype.categories)
+        if dtype is None or known < size:
+            capacity = max(size, 2 * known)
+            labels = pd.Index(domain + label_table(capacity)[known:capacity])
+            categories = labels if dtype is None else dtype.categories.append(labels)
+            dtype = pd.CategoricalDtype(categories, ordered=True)
+            self.dtypes[domain] = dtype
+        return dtype
+
+    def records(self, domains, idx):
+        # one categorical column per domain, from the codes of the rows
+        return pd.DataFrame(
+            {
+                domain: pd.Categorical.from_codes(
+                    idx[:, c], dtype=self.dtypes[domain]
+                )
+                for c, domain in enumerate(domains)
+            }
+        )
+
+    def set_domain(self, name, size):
+        # the set name holds the codes 0, ..., size - 1
+        self.dtype(name, size)
+        codes = np.arange(size, dtype=np.int32)[:, None]
+        if name not in self.container:
+            self.container.addSet(name)
+        self.container[name].setRecords(self.records([name], codes))
+
+    def set_records(self, name, domains, idx):
+        if name not in self.container:
+            self.container.addSet(name, [self.container[d] for d in domains])
+        self.container[name].setRecords(self.records(domains, idx))
+
+    def set_parameter(self, name, domains, idx, values):
+        if name not in self.container:
+            self.container.addParameter(name, [self.container[d] for d in domains])
+        records = self.records(domains, idx)
+        records["value"] = values
+        self.container[name].setRecords(records)
+
+    def write(self):
+        self.container.write(self.file)
@@ -1,7 +1,15 @@
 import pandas as pd
+import numpy as np
 import os
 import json
 
+# run status of a failed isolated run, see isolation.run_isolated
+FAILED = ["timed out", "OOM", "failed"]
+
+# binary exchange files start with this magic, then the number of rows and
+# of columns as int64, then the rows of int32 entries, all little endian
+EXCHANGE_MAGIC = b"PEXINT32"
+
 
 def incremental_range(start, stop, step, inc):
     value = start
@@ -13,7 +21,14 @@ def incremental_range(start, stop, step, inc):
 
 def create_data_frame():
     return pd.DataFrame(
-        {"I": [], "Language": [], "MeanTime": [], "MedianTime": [], "MinTime": []}
+        {
+            "I": [],
+            "Language": [],
+            "MeanTime": [],
+            "MedianTime": [],
+            "MinTime": [],
+            "Status": [],
+        }
     )
 
 
@@ -35,7 +50,21 @@ def save_to_json_d(d, name, i, model):
     df.to_json(file, orient="values")
 
 
+def save_to_bin(array, name, i, model):
+    # integer coded set for JuMP, written straight from the array buffer
+    file = os.path.join(model, "data", f"data_{name}{i}.bin")
+    array = np.ascontiguousarray(array, dtype="<i4")
+    rows, cols = (len(array), 1) if array.ndim == 1 else array.shape
+    with open(file, "wb") as f:
+        f.write(EXCHANGE_MAGIC)
+        f.write(np.array([rows, cols], dtype="<i8").tobytes())
+        array.tofile(f)
+
+
 def below_time_limit(df, limit):
+    # a run that timed out or ran out of memory ends the sweep as well
+    if "Status" in df and df["Status"].isin(FAILED).any():
+        return False
     return (df["MinTime"].max() < limit) or (df.empty)
 
 
@@ -44,6 +73,10 @@ def process_results(r, res_df):
 
 
 def print_log_message(language, n, df):
+    if "Status" in df and df["Status"].iloc[-1] in FAILED:
+        print(f"{language:<19} {df['Status'].iloc[-1]} {n:>6}")
+        return
+
     # define a standardized log
     log = "{language:<19} done {n:>6} in {time:>}s"
     print(
@@ -57,6 +90,34 @@ def print_log_message(language, n, df):
     )
 
 
+def add_speedup(df, baseline, languages):
+    # MinTime of baseline over the MinTime of every run of languages at the
+    # same |I|, NaN where baseline has no run
+    base = df[df["Language"] == baseline].set_index("I")["MinTime"]
+    rows = df["Language"].isin(languages)
+    df.loc[rows, "Speedup"] = (
+        base.reindex(df.loc[rows, "I"]).to_numpy() / df.loc[rows, "MinTime"]
+    )
+    return df
+
+
+def check_model_sizes(df, sizes):
+    # the Variables and Constraints every runner reported against the
+    # expected sizes {n: (variables, constraints)} of the models
+    if "Variables" not in df:
+        return
+    built = df.dropna(subset=["Variables", "Constraints"])
+    expected = np.array([sizes[n] for n in built["I"]]).reshape(-1, 2)
+    counts = built[["Variables", "Constraints"]].to_numpy()
+    wrong = built[(counts != expected).any(axis=1)]
+    if not wrong.empty:
+        raise ValueError(
+            "model size mismatch, expected (variables, constraints) "
+            f"{[sizes[n] for n in wrong['I']]}:\n"
+            f"{wrong[['I', 'Language', 'Variables', 'Constraints']]}"
+        )
+
+
 def save_results(df, solve, model):
     file = (
         os.path.join(model, "results", "experiment_results_solve.csv")
@@ -64,3 +125,11 @@ def save_results(df, solve, model):
         else os.path.join(model, "results", "experiment_results_model.csv")
     )
     df.pivot(index="I", columns="Language", values="MinTime").to_csv(file)
+
+    # status and additional measurements, one file per column
+    times = ["I", "Language", "MinTime", "MeanTime", "MedianTime"]
+    for column in df.columns.difference(times):
+        if df[column].notna().any():
+            df.pivot(index="I", columns="Language", values=column).to_csv(
+                file.replace("results_", f"{column}_")
+            )
@@ -0,0 +1,133 @@
+import hashlib
+import json
+import os
+import shutil
+import uuid
+
+import numpy as np
+
+
+########## Instance cache ##########
+# The instances of a sweep are prefixes of its largest one (see the seed
+# contracts of the generators), so an entry holds the arrays of the largest n
+# drawn so far, as .npy files in a directory named after the hash of the
+# parameters without n, and rows.json with the rows of every array for every n
+# drawn. Smaller n are prefix slices of the memory-mapped arrays. Loads mark
+# the entry as used, the least recently used entries are removed once the
+# cache holds more than max_bytes.
+def cache_key(**params):
+    return hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()
+
+
+def file_digest(*files):
+    # part of the key, a changed generator does not reuse old instances
+    digest = hashlib.sha1()
+    for file in files:
+        with open(file, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def load_instance(directory, key):
+    # dict of read-only memory-mapped arrays and {n: {name: rows}}, None if
+    # not cached
+    entry = os.path.join(directory, key)
+    try:
+        with open(os.path.join(entry, "rows.json")) as f:
+            rows = {int(n): r for n, r in json.load(f).items()}
+        arrays = {
+            file[: -len(".npy")]: np.load(os.path.join(entry, file), mmap_mode="r")
+            for file in os.listdir(entry)
+            if file.endswith(".npy")
+        }
+        os.utime(entry)
+    except (OSError, ValueError):
+        return None
+    return arrays, rows
+
+
+def save_instance(directory, key, arrays, rows, max_bytes=None):
+    # arrays None only updates the rows of the stored arrays. Everything is
+    # written to a temporary file or directory first, so concurrent sweeps
+    # never see a partial entry.
+    entry = os.path.join(directory, key)
+    tmp = os.path.join(directory, f".{key}.{uuid.uuid4().hex}")
+    if arrays is None:
+        with open(tmp, "w") as f:
+            json.dump(rows, f)
+        try:
+            os.replace(tmp, os.path.join(entry, "rows.json"))
+        except OSError:
+            # evicted in the meantime
+            os.remove(tmp)
+        return
+
+    os.makedirs(tmp)
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp, f"{name}.npy"), np.asarray(array))
+    with open(os.path.join(tmp, "rows.json"), "w") as f:
+        json.dump(rows, f)
+    old = f"{tmp}.old"
+    try:
+        if os.path.isdir(entry):
+            os.rename(entry, old)
+        os.rename(tmp, entry)
+    except OSError:
+        # in use or stored by someone else in the meantime
+        shutil.rmtree(tmp, ignore_errors=True)
+    shutil.rmtree(old, ignore_errors=True)
+
+    if max_bytes is not None:
+        evict(directory, max_bytes, keep=key)
+
+
+def evict(directory, max_bytes, keep=None):
+    # removes the least recently used entries until at most max_bytes remain
+    entries = []
+    for key in os.listdir(directory):
+        entry = os.path.join(directory, key)
+        if key.startswith(".") or not os.path.isdir(entry):
+            continue
+        size = sum(
+            os.path.getsize(os.path.join(entry, file)) for file in os.listdir(entry)
+        )
+        entries.append((os.path.getmtime(entry), key, size))
+
+    total = sum(size for _, _, size in entries)
+    for _, key, size in sorted(entries):
+        if total <= max_bytes:
+            break
+        if key != keep:
+            shutil.rmtree(os.path.join(directory, key), ignore_errors=True)
+            total -= size
+
+
+def cached_sweep(directory, N, params, iterate, names, max_bytes=None):
+    # Yields the arrays names of every n of the increasing sizes N. Cached n
+    # are slices of the stored arrays, iterate(missing N) draws the others in
+    # one pass. The arrays of the last n drawn replace the stored ones if
+    # they are larger. Without a directory nothing is cached.
+    if directory is None:
+        yield from iterate(N)
+        return
+
+    os.makedirs(directory, exist_ok=True)
+    key = cache_key(**params)
+    stored, rows = load_instance(directory, key) or ({}, {})
+    stop = max(rows, default=0)
+    missing = [n for n in N if n not in rows]
+    drawn = iterate(missing)
+
+    for n in N:
+        if n in rows:
+            yield tuple(stored[name][: rows[n][name]] for name in names)
+            continue
+
+        arrays = dict(zip(names, next(drawn)))
+        rows[n] = {name: len(arrays[name]) for name in names}
+        if n == missing[-1]:
+            # saved before the last yield, the sweep may not ask for more
+            save_instance(
+                directory, key, arrays if n > stop else None, rows, max_bytes
+            )
+        yield tuple(arrays[name] for name in names)
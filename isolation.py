@@ -0,0 +1,81 @@
+import os
+import time
+import signal
+import multiprocessing as mp
+
+
+########## Isolated runs ##########
+def run_isolated(runner, kwargs, timeout=None, max_rss=None, poll=0.05):
+    # runs runner(**kwargs) in a forked child and returns (status, result).
+    # The child and everything it starts (solver executables) are killed once
+    # the run exceeds timeout seconds or their summed RSS exceeds max_rss.
+    ctx = mp.get_context("fork")
+    receiver, sender = ctx.Pipe(duplex=False)
+    process = ctx.Process(target=isolated_target, args=(sender, runner, kwargs))
+    process.start()
+    sender.close()
+
+    start = time.perf_counter()
+    status, result = None, None
+    while status is None:
+        if receiver.poll(poll):
+            try:
+                status, result = receiver.recv()
+            except EOFError:
+                # the child exited without a result
+                process.join()
+                status = exit_status(process)
+        elif not process.is_alive():
+            if receiver.poll():
+                continue
+            status = exit_status(process)
+        elif timeout is not None and time.perf_counter() - start > timeout:
+            status = "timed out"
+        elif max_rss is not None and group_rss(process.pid) > max_rss:
+            status = "OOM"
+
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        process.kill()
+    process.join()
+    receiver.close()
+
+    if status == "error":
+        raise result
+    return status, result
+
+
+def exit_status(process):
+    # a SIGKILL we did not send comes from the kernel OOM killer
+    return "OOM" if process.exitcode == -signal.SIGKILL else "failed"
+
+
+def isolated_target(sender, runner, kwargs):
+    # own process group, so the whole tree can be killed at once
+    os.setpgrp()
+    try:
+        sender.send(("ok", runner(**kwargs)))
+    except MemoryError:
+        sender.send(("OOM", None))
+    except Exception as e:
+        sender.send(("error", e))
+    sender.close()
+
+
+def group_rss(pgid):
+    # resident memory of all processes in a process group in bytes (Linux)
+    page = os.sysconf("SC_PAGE_SIZE")
+    rss = 0
+    for pid in os.listdir("/proc"):
+        if not pid.isdigit():
+            continue
+        try:
+            with open(f"/proc/{pid}/stat") as f:
+                stat = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        # fields after the command: state, ppid, pgrp, ..., rss is the 22nd
+        if int(stat[2]) == pgid:
+            rss += int(stat[21]) * page
+    return rss
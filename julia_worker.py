@@ -0,0 +1,57 @@
+import json
+import select
+import subprocess
+
+
+########## Julia worker ##########
+class JuliaWorker:
+    # One long-lived julia process running script in worker mode, so package
+    # loading and JIT compilation are paid once and not per experiment. Jobs
+    # are JSON lines on its stdin, every job is answered by one JSON line on
+    # its stdout; anything else Julia prints goes to its stderr.
+    def __init__(self, script):
+        self.script = script
+        self.process = None
+
+    def start(self):
+        # unbuffered, so select sees every reply
+        self.process = subprocess.Popen(
+            ["julia", self.script, "worker"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            bufsize=0,
+        )
+
+    def run(self, job, timeout=None):
+        # reply to job, None if there is none within timeout [s]. The worker
+        # is then killed, the next job starts a new one.
+        if self.process is None or self.process.poll() is not None:
+            self.start()
+        self.process.stdin.write(json.dumps(job).encode() + b"\n")
+
+        ready, _, _ = select.select([self.process.stdout], [], [], timeout)
+        if not ready:
+            self.process.kill()
+            self.close()
+            return None
+        line = self.process.stdout.readline()
+        if not line:
+            self.close()
+            raise RuntimeError(f"julia worker {self.script} exited")
+
+        reply = json.loads(line)
+        if "error" in reply:
+            raise RuntimeError(f"julia worker {self.script}: {reply['error']}")
+        return reply
+
+    def close(self):
+        if self.process is None:
+            return
+        # end of input stops the worker loop
+        self.process.stdin.close()
+        try:
+            self.process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+        self.process = None
@@ -1,4 +1,4 @@
-import pandas as pd
+import os
 import numpy as np
 
 # import submodules
@@ -6,149 +6,289 @@ import IJKLM.data_generation as data
 import visualization
 from help import (
     create_directories,
-    create_data_frame,
     incremental_range,
     save_to_json,
-    below_time_limit,
-    process_results,
-    print_log_message,
+    save_to_bin,
     save_results,
+    check_model_sizes,
 )
-#from IJKLM.run_gurobipy import run_gurobi, run_fast_gurobi
-#from IJKLM.run_gams import data_to_gams, run_gams
-from IJKLM.run_pyomo import run_pyomo, run_fast_pyomo
-#from IJKLM.run_jump import run_julia
+from scheduler import Sweep
+from instance_cache import cached_sweep, file_digest
+import sparse_index
+from measure import configure
+#from IJKLM.run_gurobipy import run_gurobi, run_fast_gurobi, run_matrix_gurobi, run_incremental_gurobi
+#from IJKLM.run_gams import gams_export, data_to_gams, run_gams
+from IJKLM.run_pyomo import (
+    run_pyomo,
+    run_fast_pyomo,
+    run_indexed_pyomo,
+    run_kernel_pyomo,
+    run_incremental_kernel_pyomo,
+)
+#from IJKLM.run_jump import run_jump
+#from julia_worker import JuliaWorker
 
-from IJKLM.run_mosek_fusion import run_mosek_fusion
+from IJKLM.run_mosek_fusion import run_mosek_fusion, run_mosek_fusion_matrix
+from IJKLM.run_direct_mps import run_direct_mps
 
 ############## Experiment ##########################
 def run_experiment(
-    cardinality_of_i, cardinality_of_j, solve, repeats, number, time_limit
+    cardinality_of_i,
+    cardinality_of_j,
+    solve,
+    repeats,
+    number,
+    time_limit,
+    workers=0,
+    pin_cpus=True,
+    timeout=None,
+    max_rss=None,
+    memory=False,
+    profile=None,
+    cache=True,
+    cache_size=4 * 2**30,
+    exchange="bin",
+    incremental=False,
 ):
     np.random.seed(13)
 
-    # create empty frames for results
-    df_fast_jump = create_data_frame()
-    df_jump = create_data_frame()
-    df_pyomo = create_data_frame()
-    df_fast_pyomo = create_data_frame()
-    df_gurobi = create_data_frame()
-    df_fast_gurobi = create_data_frame()
-    df_gams = create_data_frame()
-    df_mosek_fusion = create_data_frame()
+    # measure peak memory and allocated blocks of every run, in children
+    # with the same limits as the runs
+    configure(memory=memory, timeout=timeout, max_rss=max_rss)
+
+    # runs every framework for every n, in a process pool if workers > 0 and
+    # in a child process killed after timeout [s] or above max_rss [bytes].
+    # Every n in profile gets one more profiled run per framework.
+    sweep = Sweep(
+        time_limit,
+        workers=workers,
+        pin_cpus=pin_cpus,
+        timeout=timeout,
+        max_rss=max_rss,
+        profile=profile,
+        profile_dir=os.path.join("IJKLM", "results", "profiles"),
+    )
 
     # define the x axis
     N = list(incremental_range(1, cardinality_of_i + 1, 10, 10))
 
-    # create fixed data and convert to tuples and dicts
-    J, K, L, M, JKL, KLM = data.create_fixed_data(m=cardinality_of_j)
-    jkl_tuple, klm_tuple = data.fixed_data_to_tuples(JKL, KLM)
-    jkl_dict, klm_dict = data.fixed_data_to_dicts(jkl_tuple, klm_tuple)
+    # create integer coded fixed data and dicts
+    J, K, L, M, jkl, klm = data.create_fixed_num_data(m=cardinality_of_j)
+    jkl_dict, klm_dict = data.fixed_data_to_dicts(
+        data.as_tuples(jkl), data.as_tuples(klm)
+    )
+
+    # one julia process for all JuMP runs, started with the first one
+    #julia = JuliaWorker("IJKLM/IJKLM.jl")
+
+    # models extended from one n to the next, by series
+    extended = {"Incremental Kernel Pyomo": {}, "Incremental Matrix GurobiPy": {}}
 
+    # gdx container for GAMS, the products of every n are added to it
+    #gdx = gams_export(J, K, L, M, jkl, klm)
 
-    jkl_ndict, klm_ndict = data.fixed_data_to_num_dicts(jkl_tuple, klm_tuple)
-    
-    # save data to json for JuMP
+    # save data for JuMP, as binary integer codes or as json labels
     save_to_json(N, "N", "", "IJKLM")
-    save_to_json(jkl_tuple, "JKL", "", "IJKLM")
-    save_to_json(klm_tuple, "KLM", "", "IJKLM")
+    if exchange == "bin":
+        save_to_bin(jkl, "JKL", "", "IJKLM")
+        save_to_bin(klm, "KLM", "", "IJKLM")
+    else:
+        save_to_json(data.num_to_labels(jkl, "jkl"), "JKL", "", "IJKLM")
+        save_to_json(data.num_to_labels(klm, "klm"), "KLM", "", "IJKLM")
+
+    # integer coded variable data, every step only draws the new products.
+    # Instances are cached on disk up to cache_size [bytes].
+    variable_data = cached_sweep(
+        os.path.join("IJKLM", "data", "cache") if cache else None,
+        N,
+        {
+            "model": "IJKLM",
+            "cardinality_of_j": cardinality_of_j,
+            "seed": 13,
+            "generator": file_digest(data.__file__, sparse_index.__file__),
+        },
+        lambda N: (
+            (I, ijk, *nnz_idx)
+            for I, ijk, nnz_idx in data.iterate_sparse_variable_data(
+                N, J, K, L, M, jkl, klm, seed=13
+            )
+        ),
+        ["I", "ijk", "ptr", "jklm"],
+        max_bytes=cache_size,
+    )
+
+    # expected model size of every n, every runner is checked against it
+    sizes = {}
 
     # run experiment for every n in |I|
-    for n in N:
-        # create variable data and convert to tuples
-        I, IJK = data.create_variable_data(n=n, j=J, k=K)
-        ijk_num_tuple = data.variable_data_to_num_tuple(IJK)
-        nnz_idx = data.data_to_nnz_idx(I, ijk_num_tuple, jkl_ndict, klm_ndict)
-        ijk_tuple = data.variable_data_to_tuples(IJK)
-
-        # save data to json for JuMP
-        save_to_json(ijk_tuple, "IJK", f"_{n}", "IJKLM")
-        
+    for n, (I, ijk, ptr, jklm) in zip(N, variable_data):
+        nnz_idx = (ptr, jklm)
+        sizes[n] = data.check_nnz_idx(I, J, K, L, ijk, jkl, klm, nnz_idx)
+
+        # save data for JuMP
+        if exchange == "bin":
+            save_to_bin(ijk, "IJK", f"_{n}", "IJKLM")
+        else:
+            save_to_json(data.num_to_labels(ijk, "ijk"), "IJK", f"_{n}", "IJKLM")
+
+        # JuMP, in the julia worker, which reads the files saved above
+#        for language in ["Fast JuMP", "JuMP"]:
+#            sweep.run(language, n, run_jump, parallel=False, isolated=False,
+#                      worker=julia, framework=language, N=n, solve=solve,
+#                      repeats=repeats, number=number, exchange=exchange,
+#                      timeout=timeout)
+
         # Gurobi
-#        if below_time_limit(df_gurobi, time_limit):
-#            rr = run_gurobi(I, ijk_tuple, jkl_tuple, klm_tuple, solve,
-#                                    repeats=repeats, number=number)
-#            df_gurobi = process_results(rr, df_gurobi)
-#            print_log_message(language='GurobiPy', n=n, df=df_gurobi)
+#        sweep.run("GurobiPy", n, run_gurobi, I=I, ijk=ijk, jkl=jkl, klm=klm,
+#                  solve=solve, repeats=repeats, number=number)
 
         # Fast Gurobi
-#        if below_time_limit(df_fast_gurobi, time_limit):
-#            rr = run_fast_gurobi(
-#                I, ijk_tuple, jkl_tuple, klm_tuple, solve, repeats=repeats, number=number)
-#            df_fast_gurobi = process_results(rr, df_fast_gurobi)
-#            print_log_message(language='Fast GurobiPy', n=n, df=df_fast_gurobi)
+#        sweep.run("Fast GurobiPy", n, run_fast_gurobi, I=I, ijk=ijk, jkl=jkl,
+#                  klm=klm, solve=solve, repeats=repeats, number=number)
+
+        # Matrix Gurobi
+#        sweep.run("Matrix GurobiPy", n, run_matrix_gurobi, I=I, nnz_idx=nnz_idx,
+#                  solve=solve, repeats=repeats, number=number)
 
         # GAMS
-#        if below_time_limit(df_gams, time_limit):
-#            data_to_gams(I, J, K, L, M, IJK, JKL, KLM)
-#            rr = run_gams(solve, n, repeats=repeats, number=number)
-#            df_gams = process_results(rr, df_gams)
-#            print_log_message(language='GAMS', n=n, df=df_gams)
+#        if sweep.active("GAMS"):
+#            data_to_gams(gdx, I, ijk)
+#        sweep.run("GAMS", n, run_gams, parallel=False, solve=solve, N=n,
+#                  repeats=repeats, number=number)
 
         # Pyomo
-        if below_time_limit(df_pyomo, time_limit):
-            rr = run_pyomo(
-                I=I,
-                IJK=ijk_tuple,
-                JKL=jkl_tuple,
-                KLM=klm_tuple,
-                solve=solve,
-                repeats=repeats,
-                number=number,
-            )
-            df_pyomo = process_results(rr, df_pyomo)
-            print_log_message(language="Pyomo", n=n, df=df_pyomo)
+        sweep.run(
+            "Pyomo",
+            n,
+            run_pyomo,
+            I=I,
+            IJK=ijk,
+            JKL=jkl,
+            KLM=klm,
+            solve=solve,
+            repeats=repeats,
+            number=number,
+        )
 
         # Fast Pyomo
-        if below_time_limit(df_fast_pyomo, time_limit):
-            rr = run_fast_pyomo(
-                I=I,
-                IJK=ijk_tuple,
-                JKL=jkl_dict,
-                KLM=klm_dict,
-                solve=solve,
-                repeats=repeats,
-                number=number,
-            )
-            df_fast_pyomo = process_results(rr, df_fast_pyomo)
-            print_log_message(language="Fast Pyomo", n=n, df=df_fast_pyomo)
+        sweep.run(
+            "Fast Pyomo",
+            n,
+            run_fast_pyomo,
+            I=I,
+            IJK=ijk,
+            JKL=jkl_dict,
+            KLM=klm_dict,
+            solve=solve,
+            repeats=repeats,
+            number=number,
+        )
 
-        # MOSEK Fusion
-        if below_time_limit(df_mosek_fusion, time_limit):
-            rr = run_mosek_fusion(
+        # Indexed Pyomo
+        sweep.run(
+            "Indexed Pyomo",
+            n,
+            run_indexed_pyomo,
+            I=I,
+            IJK=ijk,
+            JKL=jkl,
+            KLM=klm,
+            solve=solve,
+            repeats=repeats,
+            number=number,
+        )
+
+        # Kernel Pyomo
+        sweep.run(
+            "Kernel Pyomo",
+            n,
+            run_kernel_pyomo,
+            I=I,
+            nnz_idx=nnz_idx,
+            solve=solve,
+            repeats=repeats,
+            number=number,
+        )
+
+        # incremental models, only the new products are added. The models
+        # live in this process, so the runs are neither parallel, isolated nor
+        # profiled.
+        if incremental:
+            sweep.run(
+                "Incremental Kernel Pyomo",
+                n,
+                run_incremental_kernel_pyomo,
+                parallel=False,
+                isolated=False,
+                profiled=False,
+                state=extended["Incremental Kernel Pyomo"],
                 I=I,
-                J=J, 
-                K=K, 
-                L=L, 
-                M=M,
                 nnz_idx=nnz_idx,
                 solve=solve,
                 repeats=repeats,
                 number=number,
             )
-            df_mosek_fusion = process_results(rr, df_mosek_fusion)
-            print_log_message(language="MOSEK Fusion", n=n, df=df_mosek_fusion)
+#            sweep.run("Incremental Matrix GurobiPy", n, run_incremental_gurobi,
+#                      parallel=False, isolated=False, profiled=False,
+#                      state=extended["Incremental Matrix GurobiPy"], I=I,
+#                      nnz_idx=nnz_idx, solve=solve, repeats=repeats,
+#                      number=number)
+
+        # MOSEK Fusion
+        sweep.run(
+            "MOSEK Fusion",
+            n,
+            run_mosek_fusion,
+            I=I,
+            J=J,
+            K=K,
+            L=L,
+            M=M,
+            nnz_idx=nnz_idx,
+            solve=solve,
+            repeats=repeats,
+            number=number,
+        )
+
+        # MOSEK Fusion (matrix)
+        sweep.run(
+            "MOSEK Fusion (matrix)",
+            n,
+            run_mosek_fusion_matrix,
+            I=I,
+            J=J,
+            K=K,
+            L=L,
+            M=M,
+            nnz_idx=nnz_idx,
+            solve=solve,
+            repeats=repeats,
+            number=number,
+        )
 
-    # JuMP
-    #df_fast_jump, df_jump = run_julia(solve, repeats, number, time_limit)
+        # Direct MPS
+        sweep.run(
+            "Direct MPS",
+            n,
+            run_direct_mps,
+            I=I,
+            nnz_idx=nnz_idx,
+            solve=solve,
+            repeats=repeats,
+            number=number,
+        )
+
+    #julia.close()
 
     # merge all results
-    df = pd.concat(
-        [
-            #df_fast_jump,
-            #df_jump,
-            df_pyomo,
-            df_fast_pyomo,
-            #df_gurobi,
-            #df_fast_gurobi,
-            #df_gams,
-            df_mosek_fusion
-        ]
-    ).reset_index(drop=True)
+    df = sweep.results()
 
     # save results
     save_results(df, solve, "IJKLM")
 
+    # all runners built the same model
+    check_model_sizes(df, sizes)
+
     # plot results
     visualization.plot_results(df, cardinality_of_j, solve, "IJKLM")
 
@@ -167,4 +307,5 @@ if __name__ == "__main__":
         repeats=3,
         number=1,
         time_limit=60,
+        workers=0,
     )
@@ -1,4 +1,5 @@
-import pandas as pd
+import os
+from operator import getitem
 import numpy as np
 
 # import submodules
@@ -6,97 +7,363 @@ import supply_chain.data_generation as data
 import visualization
 from help import (
     create_directories,
-    create_data_frame,
     incremental_range,
     save_to_json,
     save_to_json_d,
-    below_time_limit,
-    process_results,
-    print_log_message,
+    save_to_bin,
     save_results,
+    add_speedup,
+    check_model_sizes,
 )
-from supply_chain.run_gurobipy import run_gurobi, run_fast_gurobi
-from supply_chain.run_gams import run_gams
-from supply_chain.run_pyomo import run_pyomo, run_fast_pyomo
-from supply_chain.run_jump import run_julia
+from scheduler import Sweep
+from instance_cache import cached_sweep, file_digest
+from shared_instance import Derived
+import sparse_index
+from sparse_index import as_tuples, num_to_labels
+from measure import configure
+from supply_chain.run_gurobipy import (
+    run_gurobi,
+    run_fast_gurobi,
+    run_warm_gurobi,
+    run_matrix_gurobi,
+    run_incremental_gurobi,
+    run_decomposed_gurobi,
+)
+from supply_chain.run_gams import gams_export, data_to_gams, run_gams
+from supply_chain.run_pyomo import (
+    run_pyomo,
+    run_fast_pyomo,
+    run_kernel_pyomo,
+    run_warm_pyomo,
+    run_warm_kernel_pyomo,
+    run_incremental_kernel_pyomo,
+)
+from supply_chain.run_jump import run_jump
+from julia_worker import JuliaWorker
+from supply_chain.run_direct_mps import run_direct_mps
 
 
 ############## Experiment ##########################
 def run_experiment(
-    cardinality_of_i, cardinality_of_j, solve, repeats, number, time_limit
+    cardinality_of_i,
+    cardinality_of_j,
+    solve,
+    repeats,
+    number,
+    time_limit,
+    workers=0,
+    pin_cpus=True,
+    timeout=None,
+    max_rss=None,
+    memory=False,
+    profile=None,
+    cache=True,
+    cache_size=4 * 2**30,
+    exchange="bin",
+    updates=0,
+    incremental=False,
+    decompose=(),
 ):
-    np.random.seed(13)
+    # measure peak memory and allocated blocks of every run, in children
+    # with the same limits as the runs
+    configure(memory=memory, timeout=timeout, max_rss=max_rss)
 
-    # create empty frames for results
-    df_jump = create_data_frame()
-    df_fast_jump = create_data_frame()
-    df_pyomo = create_data_frame()
-    df_fast_pyomo = create_data_frame()
-    df_gurobi = create_data_frame()
-    df_fast_gurobi = create_data_frame()
-    df_gams = create_data_frame()
+    # runs every framework for every n, in a process pool if workers > 0 and
+    # in a child process killed after timeout [s] or above max_rss [bytes].
+    # Every n in profile gets one more profiled run per framework.
+    sweep = Sweep(
+        time_limit,
+        workers=workers,
+        pin_cpus=pin_cpus,
+        timeout=timeout,
+        max_rss=max_rss,
+        profile=profile,
+        profile_dir=os.path.join("supply_chain", "results", "profiles"),
+    )
 
     # define the x axis
     N = list(incremental_range(50, cardinality_of_i + 1, 50, 50))
 
-    # create fixed data and convert to tuples and dicts
-    J, K, L, M = data.create_fixed_data(m=cardinality_of_j)
+    # create integer coded fixed data
+    J, K, L, M = data.create_fixed_num_data(m=cardinality_of_j)
 
     # save data to json for JuMP
     save_to_json(N, "N", "", "supply_chain")
-    save_to_json(L, "L", "", "supply_chain")
-    save_to_json(M, "M", "", "supply_chain")
-
-    # run experiment for every n in |I|
-    for n in N:
-        # create variable data and convert to tuples
-        (
-            I,
+    save_to_json(num_to_labels(L, "l"), "L", "", "supply_chain")
+    save_to_json(num_to_labels(M, "m"), "M", "", "supply_chain")
+
+    # one julia process for all JuMP runs, started with the first one
+    julia = JuliaWorker("supply_chain/supply_chain.jl")
+
+    # models extended from one n to the next, by series
+    extended = {"Incremental Kernel Pyomo": {}, "Incremental Matrix GurobiPy": {}}
+
+    # gdx container for GAMS, the products of every n are added to it
+    gdx = gams_export(J, K, L, M)
+
+    # integer coded variable data, every step only draws the new products.
+    # See iterate_variable_num_data for the seed contract. Instances are
+    # cached on disk up to cache_size [bytes].
+    variable_data = cached_sweep(
+        os.path.join("supply_chain", "data", "cache") if cache else None,
+        N,
+        {
+            "model": "supply_chain",
+            "cardinality_of_j": cardinality_of_j,
+            "seed": 13,
+            "generator": file_digest(data.__file__, sparse_index.__file__),
+        },
+        lambda N: data.iterate_variable_num_data(N, J, K, L, M, seed=13),
+        ["I", "IK", "IL", "IM", "IJK", "IKL", "ILM", "D"],
+        max_bytes=cache_size,
+    )
+
+    # run experiment for every n in |I|, sizes holds the (variables,
+    # constraints) of the matrix models, one column per set of x, y, z and
+    # one row per key of IK, IL, IM
+    sizes = {}
+    for n, (I, IK, IL, IM, IJK, IKL, ILM, D) in zip(N, variable_data):
+        sizes[n] = (len(IJK) + len(IKL) + len(ILM), len(IK) + len(IL) + len(IM))
+
+        # tuples and dicts for the runners, converted where the runs happen,
+        # so pool workers only receive the arrays in shared memory
+        ik_tuple = Derived(as_tuples, IK)
+        il_tuple = Derived(as_tuples, IL)
+        im_tuple = Derived(as_tuples, IM)
+        ijk_tuple = Derived(as_tuples, IJK)
+        ikl_tuple = Derived(as_tuples, IKL)
+        ilm_tuple = Derived(as_tuples, ILM)
+        d_dict = Derived(data.demand_to_dict, im_tuple, D)
+
+        # make dictionaries
+        dicts = Derived(
+            data.data_to_dicts,
             ik_tuple,
             il_tuple,
             im_tuple,
             ijk_tuple,
             ikl_tuple,
             ilm_tuple,
-            d_dict,
-        ) = data.create_variable_data(n=n, J=J, K=K, L=L, M=M)
-        # make dictionaries
-        IK_IJK, IK_IKL, IL_IKL, IL_ILM, IM_ILM = data.data_to_dicts(
-            ik_tuple, il_tuple, im_tuple, ijk_tuple, ikl_tuple, ilm_tuple
+        )
+        IK_IJK, IK_IKL, IL_IKL, IL_ILM, IM_ILM = (
+            Derived(getitem, dicts, k) for k in range(5)
         )
 
-        # save data to json for JuMP
-        save_to_json(ik_tuple, "IK", f"_{n}", "supply_chain")
-        save_to_json(il_tuple, "IL", f"_{n}", "supply_chain")
-        save_to_json(im_tuple, "IM", f"_{n}", "supply_chain")
-        save_to_json(ijk_tuple, "IJK", f"_{n}", "supply_chain")
-        save_to_json(ikl_tuple, "IKL", f"_{n}", "supply_chain")
-        save_to_json(ilm_tuple, "ILM", f"_{n}", "supply_chain")
-        save_to_json_d(d_dict, "D", f"_{n}", "supply_chain")
+        # save data for JuMP, as binary integer codes or as json labels
+        if exchange == "bin":
+            save_to_bin(IK, "IK", f"_{n}", "supply_chain")
+            save_to_bin(IL, "IL", f"_{n}", "supply_chain")
+            save_to_bin(IM, "IM", f"_{n}", "supply_chain")
+            save_to_bin(IJK, "IJK", f"_{n}", "supply_chain")
+            save_to_bin(IKL, "IKL", f"_{n}", "supply_chain")
+            save_to_bin(ILM, "ILM", f"_{n}", "supply_chain")
+            save_to_bin(np.column_stack((IM, D)), "D", f"_{n}", "supply_chain")
+        else:
+            im_labels = num_to_labels(IM, "im")
+            save_to_json(num_to_labels(IK, "ik"), "IK", f"_{n}", "supply_chain")
+            save_to_json(num_to_labels(IL, "il"), "IL", f"_{n}", "supply_chain")
+            save_to_json(im_labels, "IM", f"_{n}", "supply_chain")
+            save_to_json(num_to_labels(IJK, "ijk"), "IJK", f"_{n}", "supply_chain")
+            save_to_json(num_to_labels(IKL, "ikl"), "IKL", f"_{n}", "supply_chain")
+            save_to_json(num_to_labels(ILM, "ilm"), "ILM", f"_{n}", "supply_chain")
+            save_to_json_d(
+                dict(zip(im_labels, D.tolist())), "D", f"_{n}", "supply_chain"
+            )
+
+        # JuMP, in the julia worker, which reads the files saved above
+        for language in ["Fast JuMP", "JuMP"]:
+            sweep.run(
+                language,
+                n,
+                run_jump,
+                parallel=False,
+                isolated=False,
+                worker=julia,
+                framework=language,
+                N=n,
+                solve=solve,
+                repeats=repeats,
+                number=number,
+                exchange=exchange,
+                timeout=timeout,
+            )
 
         # GurobiPy
-        if below_time_limit(df_gurobi, time_limit):
-            rr = run_gurobi(
+        sweep.run(
+            "GurobiPy",
+            n,
+            run_gurobi,
+            I=I,
+            ik=ik_tuple,
+            il=il_tuple,
+            im=im_tuple,
+            ijk=ijk_tuple,
+            ikl=ikl_tuple,
+            ilm=ilm_tuple,
+            D=d_dict,
+            solve=solve,
+            repeats=repeats,
+            number=number,
+        )
+
+        # Fast GurobiPy
+        sweep.run(
+            "Fast GurobiPy",
+            n,
+            run_fast_gurobi,
+            I=I,
+            ik=ik_tuple,
+            il=il_tuple,
+            im=im_tuple,
+            ijk=ijk_tuple,
+            ikl=ikl_tuple,
+            ilm=ilm_tuple,
+            ik_ijk=IK_IJK,
+            ik_ikl=IK_IKL,
+            il_ikl=IL_IKL,
+            il_ilm=IL_ILM,
+            im_ilm=IM_ILM,
+            D=d_dict,
+            solve=solve,
+            repeats=repeats,
+            number=number,
+        )
+
+        # Matrix GurobiPy
+        sweep.run(
+            "Matrix GurobiPy",
+            n,
+            run_matrix_gurobi,
+            I=I,
+            K=K,
+            L=L,
+            M=M,
+            IK=IK,
+            IL=IL,
+            IM=IM,
+            IJK=IJK,
+            IKL=IKL,
+            ILM=ILM,
+            D=D,
+            solve=solve,
+            repeats=repeats,
+            number=number,
+        )
+
+        # Matrix GurobiPy of independent product blocks, for every worker
+        # count in decompose. The runs use their own pool of workers.
+        for workers in decompose:
+            sweep.run(
+                f"Decomposed Matrix GurobiPy ({workers})",
+                n,
+                run_decomposed_gurobi,
+                parallel=False,
+                exclusive=True,
                 I=I,
-                ik=ik_tuple,
-                il=il_tuple,
-                im=im_tuple,
-                ijk=ijk_tuple,
-                ikl=ikl_tuple,
-                ilm=ilm_tuple,
-                D=d_dict,
+                K=K,
+                L=L,
+                M=M,
+                IK=IK,
+                IL=IL,
+                IM=IM,
+                IJK=IJK,
+                IKL=IKL,
+                ILM=ILM,
+                D=D,
+                workers=workers,
+                blocks=4 * workers,
                 solve=solve,
                 repeats=repeats,
                 number=number,
             )
-            df_gurobi = process_results(rr, df_gurobi)
-            print_log_message(
-                language="GurobiPy", n=n, df=df_gurobi
-            )
 
-        # Fast GurobiPy
-        if below_time_limit(df_fast_gurobi, time_limit):
-            rr = run_fast_gurobi(
+        # GAMS, every run shares the same gdx file, written only while the
+        # series runs
+        if sweep.active("GAMS"):
+            data_to_gams(gdx, I, IK, IL, IM, IJK, IKL, ILM, D)
+        sweep.run(
+            "GAMS",
+            n,
+            run_gams,
+            parallel=False,
+            solve=solve,
+            N=n,
+            repeats=repeats,
+            number=number,
+        )
+
+        # Pyomo
+        sweep.run(
+            "Pyomo",
+            n,
+            run_pyomo,
+            I=I,
+            IK=ik_tuple,
+            IL=il_tuple,
+            IM=im_tuple,
+            IJK=ijk_tuple,
+            IKL=ikl_tuple,
+            ILM=ilm_tuple,
+            D=d_dict,
+            solve=solve,
+            repeats=repeats,
+            number=number,
+        )
+
+        # Fast Pyomo
+        sweep.run(
+            "Fast Pyomo",
+            n,
+            run_fast_pyomo,
+            I=I,
+            IK=ik_tuple,
+            IL=il_tuple,
+            IM=im_tuple,
+            IJK=ijk_tuple,
+            IKL=ikl_tuple,
+            ILM=ilm_tuple,
+            IK_IJK=IK_IJK,
+            IK_IKL=IK_IKL,
+            IL_IKL=IL_IKL,
+            IL_ILM=IL_ILM,
+            IM_ILM=IM_ILM,
+            D=d_dict,
+            solve=solve,
+            repeats=repeats,
+            number=number,
+        )
+
+        # Kernel Pyomo
+        sweep.run(
+            "Kernel Pyomo",
+            n,
+            run_kernel_pyomo,
+            I=I,
+            K=K,
+            L=L,
+            M=M,
+            IK=IK,
+            IL=IL,
+            IM=IM,
+            IJK=IJK,
+            IKL=IKL,
+            ILM=ILM,
+            D=D,
+            solve=solve,
+            repeats=repeats,
+            number=number,
+        )
+
+        # warm models, built once and re-solved for updates new demand vectors.
+        # MinTime is the build, checked against time_limit, the latency per
+        # update is in the Update columns.
+        if updates:
+            demands = data.create_demand_updates(n, len(IM), updates, seed=13)
+
+            sweep.run(
+                "Warm GurobiPy",
+                n,
+                run_warm_gurobi,
                 I=I,
                 ik=ik_tuple,
                 il=il_tuple,
@@ -110,96 +377,126 @@ def run_experiment(
                 il_ilm=IL_ILM,
                 im_ilm=IM_ILM,
                 D=d_dict,
+                demands=demands,
                 solve=solve,
                 repeats=repeats,
                 number=number,
             )
-            df_fast_gurobi = process_results(rr, df_fast_gurobi)
-            print_log_message(language="Fast GurobiPy", n=n, df=df_fast_gurobi)
 
-        # GAMS
-        if below_time_limit(df_gams, time_limit):
-            rr = run_gams(
+            sweep.run(
+                "Warm Pyomo",
+                n,
+                run_warm_pyomo,
                 I=I,
-                J=J,
-                K=K,
-                L=L,
-                M=M,
                 IK=ik_tuple,
                 IL=il_tuple,
                 IM=im_tuple,
                 IJK=ijk_tuple,
                 IKL=ikl_tuple,
                 ILM=ilm_tuple,
+                IK_IJK=IK_IJK,
+                IK_IKL=IK_IKL,
+                IL_IKL=IL_IKL,
+                IL_ILM=IL_ILM,
+                IM_ILM=IM_ILM,
                 D=d_dict,
+                demands=demands,
                 solve=solve,
-                N=n,
                 repeats=repeats,
                 number=number,
             )
-            df_gams = process_results(rr, df_gams)
-            print_log_message(language="GAMS", n=n, df=df_gams)
 
-        # Pyomo
-        if below_time_limit(df_pyomo, time_limit):
-            rr = run_pyomo(
+            sweep.run(
+                "Warm Kernel Pyomo",
+                n,
+                run_warm_kernel_pyomo,
                 I=I,
-                IK=ik_tuple,
-                IL=il_tuple,
-                IM=im_tuple,
-                IJK=ijk_tuple,
-                IKL=ikl_tuple,
-                ILM=ilm_tuple,
-                D=d_dict,
+                K=K,
+                L=L,
+                M=M,
+                IK=IK,
+                IL=IL,
+                IM=IM,
+                IJK=IJK,
+                IKL=IKL,
+                ILM=ILM,
+                D=D,
+                demands=demands,
                 solve=solve,
                 repeats=repeats,
                 number=number,
             )
-            df_pyomo = process_results(rr, df_pyomo)
-            print_log_message(language="Pyomo", n=n, df=df_pyomo)
 
-        # Fast Pyomo
-        if below_time_limit(df_fast_pyomo, time_limit):
-            rr = run_fast_pyomo(
-                I=I,
-                IK=ik_tuple,
-                IL=il_tuple,
-                IM=im_tuple,
-                IJK=ijk_tuple,
-                IKL=ikl_tuple,
-                ILM=ilm_tuple,
-                IK_IJK=IK_IJK,
-                IK_IKL=IK_IKL,
-                IL_IKL=IL_IKL,
-                IL_ILM=IL_ILM,
-                IM_ILM=IM_ILM,
-                D=d_dict,
-                solve=solve,
-                repeats=repeats,
-                number=number,
-            )
-            df_fast_pyomo = process_results(rr, df_fast_pyomo)
-            print_log_message(language="Fast Pyomo", n=n, df=df_fast_pyomo)
-
-    # JuMP
-    df_fast_jump, df_jump = run_julia(solve, repeats, number, time_limit)
-
-    # merge all results
-    df = pd.concat(
-        [
-            df_jump,
-            df_fast_jump,
-            df_pyomo,
-            df_fast_pyomo,
-            df_gurobi,
-            df_fast_gurobi,
-            df_gams
-        ]
-    ).reset_index(drop=True)
+        # incremental models, only the new products are added. The models
+        # live in this process, so the runs are neither parallel, isolated nor
+        # profiled.
+        if incremental:
+            for language, runner in [
+                ("Incremental Kernel Pyomo", run_incremental_kernel_pyomo),
+                ("Incremental Matrix GurobiPy", run_incremental_gurobi),
+            ]:
+                sweep.run(
+                    language,
+                    n,
+                    runner,
+                    parallel=False,
+                    isolated=False,
+                    profiled=False,
+                    state=extended[language],
+                    I=I,
+                    K=K,
+                    L=L,
+                    M=M,
+                    IK=IK,
+                    IL=IL,
+                    IM=IM,
+                    IJK=IJK,
+                    IKL=IKL,
+                    ILM=ILM,
+                    D=D,
+                    solve=solve,
+                    repeats=repeats,
+                    number=number,
+                )
+
+        # Direct MPS
+        sweep.run(
+            "Direct MPS",
+            n,
+            run_direct_mps,
+            I=I,
+            K=K,
+            L=L,
+            M=M,
+            IK=IK,
+            IL=IL,
+            IM=IM,
+            IJK=IJK,
+            IKL=IKL,
+            ILM=ILM,
+            D=D,
+            solve=solve,
+            repeats=repeats,
+            number=number,
+        )
+
+    julia.close()
+
+    # merge all results, the decomposed runs with their speedup over the
+    # monolithic Matrix GurobiPy
+    df = sweep.results()
+    df = add_speedup(
+        df,
+        "Matrix GurobiPy",
+        [f"Decomposed Matrix GurobiPy ({workers})" for workers in decompose],
+    )
 
     # save results
     save_results(df, solve, "supply_chain")
 
+    # the decomposed runs built the same model as Matrix GurobiPy
+    check_model_sizes(df, sizes)
+
     # plot results
     visualization.plot_results(df, cardinality_of_j, solve, "supply_chain")
 
@@ -218,4 +515,5 @@ if __name__ == "__main__":
             repeats=4,
             number=1,
             time_limit=5,
+            workers=0,
         )
@@ -0,0 +1,264 @@
+import cProfile
+import gc
+import os
+import pstats
+import time
+import timeit
+import tracemalloc
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from isolation import run_isolated
+from shared_instance import resolve_kwargs
+
+# additional measurements of every time_model call, set through configure
+# and profile_run. limits are the (timeout, max_rss) of the memory runs,
+# blocks collects the samples of measure_tracemalloc.
+OPTIONS = {"memory": False, "limits": (None, None), "profiler": None, "blocks": None}
+
+# result columns of the memory measurement, in bytes resp. memory blocks.
+# The Solve columns are what the solve adds to the build.
+MEMORY_METRICS = [
+    f"{phase}{metric}"
+    for phase in ["Build", "Solve"]
+    for metric in ["PeakRSS", "TracemallocPeak", "AllocatedBlocks"]
+]
+
+
+# probe names of the model functions in the order of a model build, Handoff
+# is the transfer of pending additions to the solver (Gurobi update)
+PHASE_NAMES = ["Data", "Sets", "Variables", "Constraints", "Handoff", "Solve"]
+
+# seconds per phase of the running repeat, filled by the phase probes
+PHASES = {}
+
+# variables and constraints of the model built last, filled by model_size
+SIZE = {}
+
+
+def configure(memory=False, timeout=None, max_rss=None):
+    OPTIONS["memory"] = memory
+    OPTIONS["limits"] = (timeout, max_rss)
+
+
+########## Timing ##########
+def time_model(stmt, setup, repeats, number):
+    # timeit.repeat of stmt plus a dict of additional result columns, the
+    # additional measurements run separately from the timed repeats
+    timer = timeit.Timer(stmt, globals=setup)
+    r, phases = [], []
+    SIZE.clear()
+    for _ in range(repeats):
+        PHASES.clear()
+        r.append(timer.timeit(number=number))
+        phases.append(dict(PHASES))
+
+    # phases of the fastest repeat, Other is the time outside of any probe
+    metrics = {}
+    fastest = phases[int(np.argmin(r))]
+    if fastest:
+        for name, seconds in fastest.items():
+            metrics[f"Phase{name}"] = [seconds]
+        metrics["PhaseOther"] = [min(r) - sum(fastest.values())]
+    metrics.update({name: [count] for name, count in SIZE.items()})
+
+    if OPTIONS["memory"]:
+        metrics.update(memory_metrics(stmt, setup))
+
+    # one more call under the profiler of profile_run, not part of r
+    if OPTIONS["profiler"] is not None:
+        OPTIONS["profiler"].runctx(stmt, setup, setup)
+    return r, metrics
+
+
+def time_step(stmt, setup):
+    # one timed call of a statement that changes the state it runs on, like
+    # the extension of a model to the next n. A second call would measure a
+    # different (empty) step, so repeats and number of the runner are not
+    # used, there are no memory runs in a child and no profiled call, the
+    # memory columns are NaN.
+    PHASES.clear()
+    SIZE.clear()
+    r = [timeit.Timer(stmt, globals=setup).timeit(number=1)]
+
+    metrics = {}
+    if PHASES:
+        for name, seconds in PHASES.items():
+            metrics[f"Phase{name}"] = [seconds]
+        metrics["PhaseOther"] = [r[0] - sum(PHASES.values())]
+    metrics.update({name: [count] for name, count in SIZE.items()})
+
+    if OPTIONS["memory"]:
+        metrics.update({name: [np.nan] for name in MEMORY_METRICS})
+    return r, metrics
+
+
+@contextmanager
+def phase(name):
+    # probe inside a model function, the time of every phase with the same
+    # name adds up over the calls of one repeat
+    start = time.perf_counter()
+    sample_blocks()
+    try:
+        yield
+    finally:
+        PHASES[name] = PHASES.get(name, 0.0) + time.perf_counter() - start
+        sample_blocks()
+
+
+def model_size(variables, constraints):
+    # probe inside a model function, the size of the model it built becomes
+    # the Variables and Constraints columns of the result
+    SIZE.update(Variables=variables, Constraints=constraints)
+
+
+def time_updates(update, model, demands, repeats, number):
+    # latency [s] per update of update(model, d) for the rows d of demands,
+    # timed number updates at a time, repeats times over the whole stream.
+    # The same model stays warm throughout. Returns the latencies as Update
+    # columns and the throughput [updates/s], the time columns of the result
+    # are the build of the model.
+    timer = timeit.default_timer
+    r, updates, total = [], 0, 0.0
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeats):
+            for start in range(0, len(demands), number):
+                batch = demands[start : start + number]
+                t = timer()
+                for d in batch:
+                    update(model, d)
+                t = timer() - t
+                r.append(t / len(batch))
+                updates += len(batch)
+                total += t
+    finally:
+        if gc_enabled:
+            gc.enable()
+    return {
+        "UpdateMinTime": [np.min(r)],
+        "UpdateMeanTime": [np.mean(r)],
+        "UpdateMedianTime": [np.median(r)],
+        "Throughput": [updates / total],
+    }
+
+
+########## Memory ##########
+def memory_metrics(stmt, setup):
+    # model build alone (solve=False) and model build plus solve, every
+    # measurement in a fresh child process so the peak RSS is its own. The
+    # solve is the difference of both. A child that fails or exceeds the
+    # limits of the sweep leaves the columns of its phase NaN.
+    metrics, build = {}, None
+    for phase, solve in [("Build", False), ("Solve", True)]:
+        if solve and not setup["solve"]:
+            continue
+        kwargs = {"stmt": stmt, "setup": dict(setup, solve=solve)}
+        rss_status, rss = run_isolated(measure_rss, kwargs, *OPTIONS["limits"])
+        peak_status, peak = run_isolated(
+            measure_tracemalloc, kwargs, *OPTIONS["limits"]
+        )
+        values = {"PeakRSS": rss if rss_status == "ok" else np.nan}
+        if peak_status == "ok":
+            values.update(peak)
+        else:
+            values.update(TracemallocPeak=np.nan, AllocatedBlocks=np.nan)
+        if build is None:
+            build = values
+        else:
+            values = {metric: value - build[metric] for metric, value in values.items()}
+        for metric, value in values.items():
+            metrics[f"{phase}{metric}"] = [value]
+    return metrics
+
+
+def measure_rss(stmt, setup):
+    gc.collect()
+    rss = read_status("VmRSS")
+    eval(stmt, setup)
+    return read_status("VmHWM") - rss
+
+
+def measure_tracemalloc(stmt, setup):
+    # AllocatedBlocks approximates the objects of the call: the most memory
+    # blocks of any size and allocator traced at a phase boundary or at the
+    # end, where stmt returns the model. Temporaries freed within a phase
+    # are missed.
+    OPTIONS["blocks"] = [0]
+    tracemalloc.start()
+    model = eval(stmt, setup)
+    sample_blocks()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del model
+    return {"TracemallocPeak": peak, "AllocatedBlocks": max(OPTIONS["blocks"])}
+
+
+def sample_blocks():
+    # number of live blocks allocated since tracemalloc.start
+    if OPTIONS["blocks"] is not None and tracemalloc.is_tracing():
+        OPTIONS["blocks"].append(len(tracemalloc.take_snapshot().traces))
+
+
+def read_status(field):
+    # memory field of /proc/self/status in bytes, NaN where there is none
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return np.nan
+
+
+########## Profiling ##########
+def profile_run(language, n, runner, kwargs, directory, top=25):
+    # runs runner once more and profiles one extra call of its model function,
+    # saves {language}_{n}.prof and the top functions by cumulative time
+    profiler = cProfile.Profile()
+    options = dict(OPTIONS)
+    OPTIONS.update(memory=False, profiler=profiler)
+    try:
+        kwargs = resolve_kwargs(kwargs, n)
+        runner(**dict(kwargs, repeats=1, number=1))
+    finally:
+        OPTIONS.update(options)
+
+    if not profiler.getstats():
+        # the model runs outside of Python (GAMS, JuMP), nothing to profile
+        return pd.DataFrame(
+            columns=["Function", "Calls", "TotTime", "CumTime", "I", "Language"]
+        )
+
+    name = f"{language.replace(' ', '_')}_{n}"
+    os.makedirs(directory, exist_ok=True)
+    profiler.dump_stats(os.path.join(directory, f"{name}.prof"))
+
+    df = hotspots(profiler, top)
+    df.to_csv(os.path.join(directory, f"{name}.csv"), index=False)
+    return df.assign(I=n, Language=language)
+
+
+def hotspots(profiler, top=25):
+    # table of the top functions by cumulative time
+    rows = [
+        {
+            "Function": pstats.func_std_string(func),
+            "Calls": calls,
+            "TotTime": tottime,
+            "CumTime": cumtime,
+        }
+        for func, (_, calls, tottime, cumtime, _) in pstats.Stats(
+            profiler
+        ).stats.items()
+    ]
+    return (
+        pd.DataFrame(rows, columns=["Function", "Calls", "TotTime", "CumTime"])
+        .sort_values("CumTime", ascending=False)
+        .head(top)
+        .reset_index(drop=True)
+    )
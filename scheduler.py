@@ -0,0 +1,258 @@
+import os
+import multiprocessing as mp
+from contextlib import contextmanager
+from concurrent.futures import Future, ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import numpy as np
+import pandas as pd
+
+import measure
+from shared_instance import SharedInstance, resolve_kwargs
+from isolation import run_isolated
+from help import (
+    create_data_frame,
+    below_time_limit,
+    process_results,
+    print_log_message,
+)
+
+
+########## Sweep ##########
+class Sweep:
+    # Runs the (framework, n) benchmarks of a run_experiment loop.
+    #
+    # With workers=0 every run happens in place and in order, exactly as the
+    # explicit loops did. With workers > 0 every (framework, n) is one job
+    # with all its repeats in a process pool, each worker pinned to its own
+    # core so the timings do not interfere. With pin_cpus the first core is
+    # kept for the runs that still happen in place (parallel=False), they run
+    # on it, together with every process they start, next to the pool jobs.
+    # Runs using several cores themselves (exclusive=True) instead wait for
+    # the pool to drain. Once a framework crosses the time limit at some
+    # n, its jobs for larger n are cancelled and their results dropped, which
+    # gives the same frames as the sequential below_time_limit check.
+    #
+    # With a timeout [s] or max_rss [bytes] every run happens in its own child
+    # process that is killed once it exceeds either, the run is then recorded
+    # with Status "timed out" or "OOM" and ends the sweep of that framework.
+    #
+    # For every n in profile one more untimed run per framework is profiled,
+    # see measure.profile_run. The files go to profile_dir, together with
+    # hotspots.csv of all runs.
+    #
+    # Jobs of the pool get the arrays of their kwargs as shared memory
+    # handles, see shared_instance, so they pickle the same few bytes for
+    # every n. The blocks of an n are freed once the sweep moved on to a
+    # later n and none of its jobs is pending.
+    def __init__(
+        self,
+        time_limit,
+        workers=0,
+        pin_cpus=True,
+        cpus=None,
+        timeout=None,
+        max_rss=None,
+        profile=None,
+        profile_dir=None,
+        top=25,
+    ):
+        self.time_limit = time_limit
+        self.workers = workers
+        self.timeout = timeout
+        self.max_rss = max_rss
+        self.profile = set(profile or [])
+        self.profile_dir = profile_dir
+        self.top = top
+        self.frames = {}
+        self.stop_n = {}
+        self.pending = {}
+        self.hotspots = []
+        self.instances = {}
+        self.pool = None
+        self.reserved = None
+
+        if workers:
+            if cpus is None:
+                cpus = sorted(os.sched_getaffinity(0))
+            if pin_cpus and len(cpus) > 1:
+                self.reserved, cpus = {cpus[0]}, cpus[1:]
+            queue = mp.Queue()
+            for w in range(workers):
+                queue.put(cpus[w % len(cpus)] if pin_cpus else None)
+            self.pool = ProcessPoolExecutor(
+                workers, initializer=pin_to_cpu, initargs=(queue,)
+            )
+
+    def run(
+        self,
+        language,
+        n,
+        runner,
+        parallel=True,
+        isolated=True,
+        profiled=True,
+        exclusive=False,
+        **kwargs,
+    ):
+        # runner is one of the run_* functions, kwargs its arguments. Runners
+        # sharing files between calls (GAMS) must pass parallel=False, runners
+        # driving their own process (JuMP) isolated=False and parallel=False,
+        # runners with their own pool of workers exclusive=True as well.
+        # Runners changing their state (incremental) must pass profiled=False,
+        # a second run would profile a different step. Their state is a dict
+        # of the caller holding the model of the previous n, every run only
+        # adds the products it does not have yet, once, timed by time_step,
+        # and reports MarginalTime, the time per added product. The state
+        # lives in this process, so these runs are neither parallel nor
+        # isolated.
+        frame = self.frames.setdefault(language, create_data_frame())
+
+        if self.pool is None or not parallel:
+            if below_time_limit(frame, self.time_limit):
+                if exclusive:
+                    self.drain()
+                limits = (self.timeout, self.max_rss) if isolated else (None, None)
+                with pinned(None if exclusive else self.reserved):
+                    rr = run_job(language, n, runner, kwargs, *limits)
+                    self.frames[language] = process_results(rr, frame)
+                    print_log_message(
+                        language=language, n=n, df=self.frames[language]
+                    )
+                    if profiled and (rr["Status"] == "ok").all():
+                        self.profile_run(language, n, runner, kwargs, parallel=False)
+            return
+
+        if language in self.stop_n:
+            return
+
+        instance = self.instances.setdefault(n, SharedInstance())
+        kwargs = {k: instance.share(v) for k, v in kwargs.items()}
+        self.pending[language, n] = self.pool.submit(
+            run_job, language, n, runner, kwargs, self.timeout, self.max_rss
+        )
+        if profiled:
+            self.profile_run(language, n, runner, kwargs)
+
+        # keep at most a few jobs per worker queued, data for later n waits
+        self.collect(block=len(self.pending) > 2 * self.workers)
+
+    def active(self, language):
+        # whether runs of language still happen, data prepared only for its
+        # runs can be skipped otherwise
+        frame = self.frames.get(language, create_data_frame())
+        return language not in self.stop_n and below_time_limit(
+            frame, self.time_limit
+        )
+
+    def collect(self, block=False):
+        if block:
+            wait(self.pending.values(), return_when=FIRST_COMPLETED)
+        for (language, n), f in list(self.pending.items()):
+            if f.done():
+                del self.pending[language, n]
+                if not f.cancelled():
+                    self.finish(language, n, f.result())
+        self.release(keep=max(self.instances, default=None))
+
+    def drain(self):
+        # waits for every job and profiled run in the pool
+        while self.pending:
+            self.collect(block=True)
+        wait([h for h in self.hotspots if isinstance(h, Future)])
+
+    def finish(self, language, n, rr):
+        if n > self.stop_n.get(language, np.inf):
+            return
+
+        frame = process_results(rr, self.frames[language])
+
+        if not below_time_limit(rr, self.time_limit):
+            # drop everything the sequential sweep would not have run
+            self.stop_n[language] = n
+            frame = frame[frame["I"] <= n]
+            for (lang, nn), f in self.pending.items():
+                if lang == language and nn > n:
+                    f.cancel()
+
+        self.frames[language] = frame
+        print_log_message(language=language, n=n, df=frame)
+
+    def release(self, keep=None):
+        # closes the shared instances of every n but keep without pending jobs
+        if any(isinstance(h, Future) and not h.done() for h in self.hotspots):
+            return
+        busy = {n for _, n in self.pending}
+        for n in list(self.instances):
+            if n != keep and n not in busy:
+                self.instances.pop(n).close()
+
+    def profile_run(self, language, n, runner, kwargs, parallel=True):
+        if n not in self.profile:
+            return
+        args = (language, n, runner, kwargs, self.profile_dir, self.top)
+        if self.pool is None or not parallel:
+            self.hotspots.append(measure.profile_run(*args))
+        else:
+            self.hotspots.append(self.pool.submit(measure.profile_run, *args))
+
+    def results(self):
+        while self.pending:
+            self.collect(block=True)
+
+        if self.hotspots:
+            pd.concat(
+                [h.result() if isinstance(h, Future) else h for h in self.hotspots]
+            ).to_csv(os.path.join(self.profile_dir, "hotspots.csv"), index=False)
+        self.release()
+
+        if self.pool is not None:
+            self.pool.shutdown()
+        return pd.concat(
+            [df.sort_values("I") for df in self.frames.values()]
+        ).reset_index(drop=True)
+
+
+def pin_to_cpu(cpus):
+    # pool initializer, every worker takes the next core from the queue
+    cpu = cpus.get()
+    if cpu is not None and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, {cpu})
+
+
+@contextmanager
+def pinned(cpus):
+    # runs the block, and every process it starts, on cpus only
+    if not cpus or not hasattr(os, "sched_setaffinity"):
+        yield
+        return
+    previous = os.sched_getaffinity(0)
+    os.sched_setaffinity(0, cpus)
+    try:
+        yield
+    finally:
+        os.sched_setaffinity(0, previous)
+
+
+########## Isolated runs ##########
+def run_job(language, n, runner, kwargs, timeout=None, max_rss=None):
+    # arrays in shared memory and Derived values are resolved here, once for
+    # all repeats of an isolated run
+    kwargs = resolve_kwargs(kwargs, n)
+    if timeout is None and max_rss is None:
+        result = runner(**kwargs)
+        # runners with their own limits report the status themselves
+        return result if "Status" in result else result.assign(Status="ok")
+
+    status, result = run_isolated(runner, kwargs, timeout, max_rss)
+    if status == "ok":
+        return result.assign(Status="ok")
+    return pd.DataFrame(
+        {
+            "I": [n],
+            "Language": [language],
+            "MinTime": [np.nan],
+            "MeanTime": [np.nan],
+            "MedianTime": [np.nan],
+            "Status": [status],
+        }
+    )
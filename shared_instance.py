@@ -0,0 +1,122 @@
+import copy
+import uuid
+from collections import OrderedDict
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# blocks attached in this process, the most recent ones are kept for the
+# next runs of the same n
+ATTACHED = OrderedDict()
+KEEP = 32
+
+# Derived values computed in this process for the n of the last run
+DERIVED = {}
+DERIVED_N = [None]
+
+
+########## Shared instances ##########
+class SharedArray:
+    # picklable handle of an array copied to a shared memory block, resolved
+    # to a read-only view of the block in the process that runs the job
+    def __init__(self, name, dtype, shape):
+        self.name = name
+        self.dtype = dtype
+        self.shape = shape
+
+
+class Derived:
+    # the value func(*args, **kwargs), computed where the job runs, e.g. the
+    # tuples of an integer coded set in a pool worker instead of pickling
+    # them. args may hold arrays, handles and other Derived. Every process
+    # computes a value once per n, see resolve_kwargs.
+    def __init__(self, func, *args, **kwargs):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.token = uuid.uuid4().hex
+
+
+class SharedInstance:
+    # the shared memory blocks of the arrays of one n. Jobs pickle handles
+    # only, so their size does not depend on the size of the instance.
+    def __init__(self):
+        self.blocks = {}
+
+    def share(self, value):
+        # value with every array, also inside tuples and Derived, replaced
+        # by the handle of a copy in shared memory, every array copied once
+        if isinstance(value, np.ndarray) and value.dtype != object:
+            if id(value) not in self.blocks:
+                block = shared_memory.SharedMemory(
+                    create=True, size=max(1, value.nbytes)
+                )
+                np.ndarray(value.shape, value.dtype, buffer=block.buf)[...] = value
+                handle = SharedArray(block.name, value.dtype.str, value.shape)
+                # the array is kept, so its id is not reused
+                self.blocks[id(value)] = (value, block, handle)
+            return self.blocks[id(value)][2]
+        if isinstance(value, tuple):
+            return tuple(self.share(v) for v in value)
+        if isinstance(value, Derived):
+            shared = copy.copy(value)
+            shared.args = self.share(value.args)
+            shared.kwargs = {k: self.share(v) for k, v in value.kwargs.items()}
+            return shared
+        return value
+
+    def close(self):
+        for _, block, _ in self.blocks.values():
+            block.close()
+            block.unlink()
+        self.blocks.clear()
+
+
+def resolve_kwargs(kwargs, n):
+    # the kwargs of a run at n resolved, the Derived values of an earlier n
+    # are dropped first, as the sweep no longer needs them
+    if DERIVED_N[0] != n:
+        DERIVED.clear()
+        DERIVED_N[0] = n
+    return {k: resolve(v) for k, v in kwargs.items()}
+
+
+def resolve(value):
+    # inverse of SharedInstance.share, also computes Derived values
+    if isinstance(value, SharedArray):
+        return attach(value)
+    if isinstance(value, tuple):
+        return tuple(resolve(v) for v in value)
+    if isinstance(value, Derived):
+        if value.token not in DERIVED:
+            DERIVED[value.token] = value.func(
+                *resolve(value.args),
+                **{k: resolve(v) for k, v in value.kwargs.items()},
+            )
+        return DERIVED[value.token]
+    return value
+
+
+def attach(handle):
+    block = ATTACHED.get(handle.name)
+    if block is None:
+        # children of the sweep share its resource tracker, which already
+        # knows the block, so attaching does not take the unlink over
+        block = shared_memory.SharedMemory(name=handle.name)
+        ATTACHED[handle.name] = block
+        release()
+    ATTACHED.move_to_end(handle.name)
+
+    view = np.ndarray(handle.shape, np.dtype(handle.dtype), buffer=block.buf)
+    view.flags.writeable = False
+    return view
+
+
+def release():
+    # closes the oldest attached blocks without views left
+    for name in list(ATTACHED)[:-KEEP]:
+        try:
+            ATTACHED[name].close()
+        except BufferError:
+            continue
+        del ATTACHED[name]
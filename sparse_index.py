@@ -0,0 +1,194 @@
+import itertools
+import numpy as np
+from collections import defaultdict
+from operator import itemgetter
+
+
+########## Prefix index ##########
+class PrefixIndex:
+    # Groups the rows of a tuple set by the entries at the positions in key,
+    # e.g. key=(0, 2) groups IJK by (i, k). The rows are sorted once into
+    # members, group g is members[ptr[g]:ptr[g + 1]] and index[i, k] returns
+    # that slice: a view for integer arrays, a list slice for tuples. Keys
+    # without rows give an empty group. A single key position is looked up by
+    # the entry itself, index[i] instead of index[i,].
+    #
+    # rows is an iterable of tuples or a 2-D integer array. For tuples, keys
+    # come first in the group order, including keys without rows. For arrays,
+    # shape are the sizes of the key columns and every code has its group.
+    # values are the positions kept in members, by default the whole row.
+    def __init__(self, rows, key, values=None, keys=None, shape=None):
+        self.key = tuple(key)
+        self.shape = shape
+
+        if isinstance(rows, np.ndarray):
+            self.groups = None
+            codes = np.ravel_multi_index(tuple(rows[:, list(self.key)].T), shape)
+            self.order, self.ptr = group_offsets(codes, int(np.prod(shape)))
+            members = rows[self.order]
+            if values is not None:
+                members = members[:, values]
+        else:
+            rows = list(rows)
+            get = itemgetter(*self.key)
+            keys = dict.fromkeys(itertools.chain(keys or (), map(get, rows)))
+            self.groups = {k: g for g, k in enumerate(keys)}
+            codes = np.fromiter(
+                map(self.groups.__getitem__, map(get, rows)),
+                dtype=np.int64,
+                count=len(rows),
+            )
+            self.order, self.ptr = group_offsets(codes, len(self.groups))
+            members = [rows[p] for p in self.order.tolist()]
+            if values is not None:
+                members = list(map(itemgetter(values), members))
+            # python ints slice lists faster than numpy scalars
+            self.ptr = self.ptr.tolist()
+        self.members = members
+
+    def group(self, key):
+        # group number of key, None for an unknown key of a tuple set
+        if self.groups is None:
+            key = key if isinstance(key, tuple) else (key,)
+            return int(np.ravel_multi_index(key, self.shape))
+        return self.groups.get(key)
+
+    def __getitem__(self, key):
+        g = self.group(key)
+        if g is None:
+            return self.members[:0]
+        return self.members[self.ptr[g] : self.ptr[g + 1]]
+
+    def __len__(self):
+        return len(self.ptr) - 1
+
+    def keys(self):
+        # every key of a tuple set, the keys of the non-empty groups of arrays
+        if self.groups is not None:
+            return self.groups.keys()
+        nonempty = np.flatnonzero(np.diff(self.ptr))
+        keys = zip(*[c.tolist() for c in np.unravel_index(nonempty, self.shape)])
+        return [k[0] if len(k) == 1 else k for k in keys]
+
+    def items(self):
+        return ((k, self[k]) for k in self.keys())
+
+    def to_dict(self):
+        # plain lists per key, missing keys give an empty list
+        return defaultdict(
+            list,
+            {
+                k: v.tolist() if isinstance(v, np.ndarray) else v
+                for k, v in self.items()
+            },
+        )
+
+    def join(self, keys):
+        # every row of the 2-D integer array keys (the entries at the key
+        # positions) with every member of its group: returns the repeated row
+        # positions and the matched members
+        codes = np.ravel_multi_index(tuple(keys.T), self.shape)
+        rows, positions = expand_groups(codes, self.ptr)
+        return rows, self.members[positions]
+
+
+########## Integer coded sets ##########
+# Integer coded sets hold 0-based int32 positions, code c of set "i" is
+# labelled f"i{c + 1}" as in the string data. The numbers come from one shared
+# table, which is only built when a model or a file needs names.
+_label_table = np.empty(0, dtype=object)
+
+
+def label_table(size):
+    # grows to at least twice its length, only the missing numbers are made
+    global _label_table
+    known = len(_label_table)
+    if known < size:
+        numbers = range(known + 1, max(size, 2 * known) + 1)
+        added = np.array([str(x) for x in numbers], dtype=object)
+        _label_table = np.concatenate((_label_table, added))
+    return _label_table
+
+
+def num_to_labels(idx, names):
+    table = label_table(int(idx.max()) + 1 if idx.size else 0)
+    if idx.ndim == 1:
+        return (names + table[idx]).tolist()
+    return list(zip(*[name + table[idx[:, c]] for c, name in enumerate(names)]))
+
+
+def as_tuples(x):
+    # the runners iterate python tuples, integer coded sets come as arrays
+    if isinstance(x, np.ndarray):
+        return list(map(tuple, x.tolist())) if x.ndim > 1 else x.tolist()
+    return x
+
+
+########## CSR helpers ##########
+def group_offsets(codes, size):
+    # CSR grouping of integer codes in [0, size): group g holds the positions
+    # order[ptr[g]:ptr[g + 1]], in their original order
+    order = np.argsort(codes, kind="stable")
+    ptr = np.zeros(size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(codes, minlength=size), out=ptr[1:])
+    return order, ptr
+
+
+def expand_groups(codes, ptr):
+    # join every row with all members of its group in the sorted order of
+    # group_offsets: returns the repeated row positions and the matched
+    # positions in that order
+    start = ptr[codes]
+    counts = ptr[codes + 1] - start
+    rows = np.repeat(np.arange(len(codes)), counts)
+    shift = np.repeat(np.cumsum(counts) - counts - start, counts)
+    return rows, np.arange(len(rows)) - shift
+
+
+def positions(keys, rows, shape):
+    # position of every row of rows among the rows of keys, both integer
+    # coded with columns of the sizes in shape, -1 for rows not in keys
+    table = np.full(int(np.prod(shape)), -1, dtype=np.int64)
+    table[np.ravel_multi_index(tuple(keys.T), shape)] = np.arange(len(keys))
+    return table[np.ravel_multi_index(tuple(rows.T), shape)]
+
+
+########## Growing arrays ##########
+class RowBuffer:
+    # Append-only rows of an integer coded set with amortized growth. Rows
+    # are appended in product order, so the rows of the products i < n are a
+    # prefix and prefix(n) is a view. Appends only write behind the rows
+    # handed out so far, earlier views keep their values.
+    def __init__(self):
+        self.rows = None
+        self.size = 0
+
+    def extend(self, rows):
+        if self.rows is None:
+            self.rows = np.empty((2 * len(rows),) + rows.shape[1:], dtype=rows.dtype)
+        elif self.size + len(rows) > len(self.rows):
+            grown = np.empty(
+                (2 * (self.size + len(rows)),) + rows.shape[1:], dtype=rows.dtype
+            )
+            grown[: self.size] = self.rows[: self.size]
+            self.rows = grown
+        self.rows[self.size : self.size + len(rows)] = rows
+        self.size += len(rows)
+
+    def view(self, stop):
+        return self.rows[:stop]
+
+    def prefix(self, n):
+        # rows whose first entry, the product, is below n
+        return self.view(int(np.searchsorted(self.rows[: self.size, 0], n)))
+
+
+def product_block(rows, start, stop=None):
+    # rows of the products start, ..., stop - 1 (all from start if stop is
+    # None) of a set sorted by product, with the products renumbered from 0
+    products = rows[:, 0]
+    lo = np.searchsorted(products, start)
+    hi = len(rows) if stop is None else np.searchsorted(products, stop)
+    shift = np.zeros(rows.shape[1], dtype=rows.dtype)
+    shift[0] = start
+    return rows[lo:hi] - shift
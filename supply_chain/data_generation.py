@@ -1,8 +1,9 @@
 import pandas as pd
 import numpy as np
 import random
-import itertools
-from operator import itemgetter
+import scipy.sparse as sp
+
+from sparse_index import PrefixIndex, RowBuffer, positions
 
 random.seed(13)
 
@@ -86,42 +87,188 @@ def create_variable_data(n, J, K, L, M):
     return I, IK, IL, IM, IJK, IKL, ILM, D
 
 
+########## Integer coded data ##########
+def create_fixed_num_data(m):
+    J = np.arange(m, dtype=np.int32)
+    K = np.arange(m, dtype=np.int32)
+    L = np.arange(m, dtype=np.int32)
+    M = np.arange(m, dtype=np.int32)
+    return J, K, L, M
+
+
+def create_variable_num_data(n, J, K, L, M, seed=13, block=1024):
+    # The sets of create_variable_data as 0-based int32 arrays, drawn the same
+    # way but with numpy in time linear in their size. D holds the demand of
+    # every row of IM. See iterate_variable_num_data for the seed contract.
+    return next(iterate_variable_num_data([n], J, K, L, M, seed, block))
+
+
+def iterate_variable_num_data(N, J, K, L, M, seed=13, block=1024):
+    # Yields create_variable_num_data(n) for every n of the increasing sizes
+    # N. Products are drawn in blocks of block products, every block once, and
+    # the sets for n are views of the rows of the products i < n, so a step
+    # only costs the new products.
+    #
+    # Seed contract: the rows of product i depend only on seed, the block of i
+    # and |J|, ..., |M|, not on n or on the sizes drawn before. The links JK,
+    # KL and LM depend only on seed and |J|, ..., |M|. So one n alone and n as
+    # part of a sweep give the same sets.
+    JK, KL, LM = create_fixed_num_links(J, K, L, M, seed)
+
+    names = ["IK", "IL", "IM", "IJK", "IKL", "ILM"]
+    buffers = {name: RowBuffer() for name in names + ["D"]}
+    drawn = 0
+    for n in N:
+        while drawn < n:
+            rows = create_product_block(drawn, block, J, K, L, M, JK, KL, LM, seed)
+            for name, buffer in buffers.items():
+                buffer.extend(rows[name])
+            drawn += block
+
+        IK, IL, IM, IJK, IKL, ILM = (buffers[name].prefix(n) for name in names)
+        D = buffers["D"].view(len(IM))
+        yield np.arange(n, dtype=np.int32), IK, IL, IM, IJK, IKL, ILM, D
+
+
+def create_demand_updates(n, rows, updates, seed=13):
+    # updates new demand vectors for the rows of IM at |I| = n, drawn like D
+    # from a stream of their own
+    rng = np.random.default_rng([seed, 2, n])
+    return rng.integers(0, 101, size=(updates, rows))
+
+
+def create_fixed_num_links(J, K, L, M, seed=13):
+    # JK, KL and LM from their own stream
+    n_j, n_k, n_l, n_m = len(J), len(K), len(L), len(M)
+    share = int(np.ceil(n_j * 0.05))
+    rng = np.random.default_rng([seed, 0])
+
+    # JK, every k has a j
+    JK = sample_pairs(rng, n_j, n_k, share)
+    JK = cover(rng, JK, 1, n_k, n_j)
+
+    # KL & LM, share l for every (k, m), every l has a k and an m
+    KML = sample_pairs(rng, n_k * n_m, n_l, share)
+    k, m = np.unravel_index(KML[:, 0], (n_k, n_m))
+    KL = unique_rows(np.column_stack((k, KML[:, 1])), (n_k, n_l))
+    LM = unique_rows(np.column_stack((KML[:, 1], m)), (n_l, n_m))
+    KL = cover(rng, KL, 1, n_l, n_k)
+    LM = cover(rng, LM, 0, n_l, n_m)
+    return JK, KL, LM
+
+
+def create_product_block(start, block, J, K, L, M, JK, KL, LM, seed=13):
+    # all rows of the products start, ..., start + block - 1, sorted by
+    # product, from the stream of this block
+    n_j, n_k, n_l, n_m = len(J), len(K), len(L), len(M)
+    share = int(np.ceil(n_j * 0.05))
+    rng = np.random.default_rng([seed, 1, start // block])
+
+    # IJ, within the first |J| products every j has a product i
+    IJ = sample_pairs(rng, block, n_j, share)
+    if start == 0:
+        first = min(n_j, block)
+        IJ = np.concatenate((cover(rng, IJ[IJ[:, 0] < first], 1, n_j, first), IJ))
+        IJ = unique_rows(IJ, (block, n_j))
+
+    # IJK and IK from around 50% of IJK
+    rows, k = PrefixIndex(JK, (0,), values=1, shape=(n_j,)).join(IJ[:, 1:])
+    IJK = np.column_stack((IJ[rows], k))
+    reduced = rng.random(len(IJK)) < 0.5
+    IK = unique_rows(IJK[reduced][:, [0, 2]], (block, n_k))
+
+    # IKL, IL, ILM and IM of IJK x KL x LM, every l has an m
+    rows, l = PrefixIndex(KL, (0,), values=1, shape=(n_k,)).join(IJK[:, 2:])
+    IKL = unique_rows(np.column_stack((IJK[rows][:, [0, 2]], l)), (block, n_k, n_l))
+    IL = unique_rows(IKL[:, [0, 2]], (block, n_l))
+    rows, m = PrefixIndex(LM, (0,), values=1, shape=(n_l,)).join(IL[:, 1:])
+    ILM = np.column_stack((IL[rows], m))
+    IM = unique_rows(ILM[:, [0, 2]], (block, n_m))
+
+    # Demand
+    D = rng.integers(0, 101, size=len(IM))
+
+    rows = {"IK": IK, "IL": IL, "IM": IM, "IJK": IJK, "IKL": IKL, "ILM": ILM}
+    for name, x in rows.items():
+        x = x.astype(np.int32)
+        x[:, 0] += start
+        rows[name] = x
+    rows["D"] = D
+    return rows
+
+
+def sample_pairs(rng, rows, size, share):
+    # share distinct entries of [0, size) for every row of [0, rows)
+    cols = np.argsort(rng.random((rows, size)), axis=1)[:, :share]
+    return np.column_stack((np.repeat(np.arange(rows), share), cols.ravel()))
+
+
+def cover(rng, pairs, col, size, other):
+    # adds a pair with a random entry of [0, other) for every value of
+    # [0, size) missing in column col
+    missing = np.flatnonzero(np.bincount(pairs[:, col], minlength=size) == 0)
+    extra = np.empty((len(missing), 2), dtype=pairs.dtype)
+    extra[:, col] = missing
+    extra[:, 1 - col] = rng.integers(other, size=len(missing))
+    return np.concatenate((pairs, extra))
+
+
+def unique_rows(rows, shape):
+    # the distinct rows of an integer array, sorted, by marking their codes
+    # in a table of all codes instead of sorting
+    seen = np.zeros(int(np.prod(shape)), dtype=bool)
+    seen[np.ravel_multi_index(tuple(rows.T), shape)] = True
+    codes = np.flatnonzero(seen)
+    return np.column_stack(np.unravel_index(codes, shape)).astype(np.int32)
+
+
 def data_to_dicts(IK, IL, IM, IJK, IKL, ILM):
-    IK_IJK = {(i, k): [] for (i, k) in IK}
-    IK_IKL = {(i, k): [] for (i, k) in IK}
-    IL_IKL = {(i, l): [] for (i, l) in IL}
-    IL_ILM = {(i, l): [] for (i, l) in IL}
-    IM_ILM = {(i, m): [] for (i, m) in IM}
-
-    IK_IJK.update(
-        {
-            (i, k): list(group)
-            for (i, k), group in itertools.groupby(sorted(IJK), itemgetter(0, 2))
-        }
-    )
-    IK_IKL.update(
-        {
-            (i, k): list(group)
-            for (i, k), group in itertools.groupby(sorted(IKL), itemgetter(0, 1))
-        }
-    )
-    IL_IKL.update(
-        {
-            (i, l): list(group)
-            for (i, l), group in itertools.groupby(sorted(IKL), itemgetter(0, 2))
-        }
-    )
-    IL_ILM.update(
-        {
-            (i, l): list(group)
-            for (i, l), group in itertools.groupby(sorted(ILM), itemgetter(0, 1))
-        }
-    )
-    IM_ILM.update(
-        {
-            (i, m): list(group)
-            for (i, m), group in itertools.groupby(sorted(ILM), itemgetter(0, 2))
-        }
-    )
+    # prefix indexes, every key of IK, IL and IM has a group, if empty
+    IK_IJK = PrefixIndex(IJK, (0, 2), keys=IK)
+    IK_IKL = PrefixIndex(IKL, (0, 1), keys=IK)
+    IL_IKL = PrefixIndex(IKL, (0, 2), keys=IL)
+    IL_ILM = PrefixIndex(ILM, (0, 1), keys=IL)
+    IM_ILM = PrefixIndex(ILM, (0, 2), keys=IM)
 
     return IK_IJK, IK_IKL, IL_IKL, IL_ILM, IM_ILM
+
+
+def demand_to_dict(IM, D):
+    # demand of every tuple of IM
+    return dict(zip(IM, D.tolist()))
+
+
+def supply_chain_matrix(shape, IK, IL, IM, IJK, IKL, ILM, D):
+    # A and rhs of A [x, y, z] >= rhs, with the production rows IK, the
+    # transport rows IL and the demand rows IM stacked in that order
+    n_i, n_k, n_l, n_m = shape
+    rows, cols, vals = [], [], []
+
+    def add(row_offset, keys, key_shape, terms, col_offset, value):
+        # every term enters the row of its key, if there is one
+        r = positions(keys, terms, key_shape)
+        c = np.flatnonzero(r >= 0)
+        rows.append(r[c] + row_offset)
+        cols.append(c + col_offset)
+        vals.append(np.full(len(c), value))
+
+    y_offset, z_offset = len(IJK), len(IJK) + len(IKL)
+    t_offset, d_offset = len(IK), len(IK) + len(IL)
+
+    # production: x(i,j,k) - y(i,k,l) >= 0
+    add(0, IK, (n_i, n_k), IJK[:, [0, 2]], 0, 1.0)
+    add(0, IK, (n_i, n_k), IKL[:, [0, 1]], y_offset, -1.0)
+
+    # transport: y(i,k,l) - z(i,l,m) >= 0
+    add(t_offset, IL, (n_i, n_l), IKL[:, [0, 2]], y_offset, 1.0)
+    add(t_offset, IL, (n_i, n_l), ILM[:, [0, 1]], z_offset, -1.0)
+
+    # demand: z(i,l,m) >= d(i,m)
+    add(d_offset, IM, (n_i, n_m), ILM[:, [0, 2]], z_offset, 1.0)
+
+    A = sp.csr_matrix(
+        (np.concatenate(vals), (np.concatenate(rows), np.concatenate(cols))),
+        shape=(d_offset + len(IM), z_offset + len(ILM)),
+    )
+    rhs = np.concatenate((np.zeros(d_offset), D))
+    return A, rhs
@@ -0,0 +1,142 @@
+import os
+import pandas as pd
+import numpy as np
+import gurobipy as gpy
+
+from supply_chain.data_generation import supply_chain_matrix
+from measure import time_model, phase
+
+
+########## Direct MPS ##########
+def run_direct_mps(I, K, L, M, IK, IL, IM, IJK, IKL, ILM, D, solve, repeats, number):
+    setup = {
+        "shape": (len(I), len(K), len(L), len(M)),
+        "IK": IK,
+        "IL": IL,
+        "IM": IM,
+        "IJK": IJK,
+        "IKL": IKL,
+        "ILM": ILM,
+        "D": D,
+        # one file per process, runs may share the data directory
+        "file": os.path.join("supply_chain", "data", f"model_{os.getpid()}.mps"),
+        "solve": solve,
+        "model_function": direct_mps,
+    }
+    try:
+        r, metrics = time_model(
+            "model_function(shape, IK, IL, IM, IJK, IKL, ILM, D, file, solve)",
+            setup,
+            repeats=repeats,
+            number=number,
+        )
+    finally:
+        if os.path.exists(setup["file"]):
+            os.remove(setup["file"])
+
+    result = pd.DataFrame(
+        {
+            "I": [len(I)],
+            "Language": ["Direct MPS"],
+            "MinTime": [np.min(r)],
+            "MeanTime": [np.mean(r)],
+            "MedianTime": [np.median(r)],
+            **metrics,
+        }
+    )
+    return result
+
+
+def direct_mps(shape, IK, IL, IM, IJK, IKL, ILM, D, file, solve, chunk_size=2**16):
+    # free MPS straight from A [x, y, z] >= rhs of supply_chain_matrix, column
+    # c is the c-th variable and row r the r-th row of A. Columns without any
+    # row get a 0 in the objective, so they exist. The constant objective is
+    # left out and all variables keep the default bounds [0, inf). Names are
+    # zero padded, so every section is a byte array of fixed width lines
+    # written chunk_size lines at a time.
+    with phase("Data"):
+        A, rhs = supply_chain_matrix(shape, IK, IL, IM, IJK, IKL, ILM, D)
+        A = A.tocsc()
+        cols = np.repeat(np.arange(A.shape[1]), np.diff(A.indptr))
+        empty = np.flatnonzero(np.diff(A.indptr) == 0)
+        demand = np.flatnonzero(rhs)
+        width_c, width_r = len(str(A.shape[1])), len(str(A.shape[0]))
+
+    def write(f, *fields, size):
+        # fields are byte strings or functions of the slice of a chunk
+        for start in range(0, size, chunk_size):
+            chunk = slice(start, min(start + chunk_size, size))
+            rows = chunk.stop - chunk.start
+            f.write(
+                np.hstack(
+                    [
+                        field(chunk)
+                        if callable(field)
+                        else np.broadcast_to(
+                            np.frombuffer(field, np.uint8), (rows, len(field))
+                        )
+                        for field in fields
+                    ]
+                ).tobytes()
+            )
+
+    with phase("Handoff"), open(file, "wb") as f:
+        f.write(b"NAME supply_chain\nROWS\n N obj\n")
+        write(
+            f,
+            b" G r",
+            lambda s: digits(np.arange(s.start, s.stop), width_r),
+            b"\n",
+            size=A.shape[0],
+        )
+
+        # the coefficients of A are 1 and -1
+        f.write(b"COLUMNS\n")
+        write(
+            f,
+            b" c",
+            lambda s: digits(cols[s], width_c),
+            b" r",
+            lambda s: digits(A.indices[s], width_r),
+            lambda s: np.where(A.data[s, None] > 0, b"  1", b" -1").view(np.uint8),
+            b"\n",
+            size=A.nnz,
+        )
+        write(
+            f,
+            b" c",
+            lambda s: digits(empty[s], width_c),
+            b" obj 0\n",
+            size=len(empty),
+        )
+
+        # the demands are integers
+        f.write(b"RHS\n")
+        write(
+            f,
+            b" rhs r",
+            lambda s: digits(demand[s], width_r),
+            b" ",
+            lambda s: digits(rhs[demand[s]].astype(np.int64), len(str(int(rhs.max())))),
+            b"\n",
+            size=len(demand),
+        )
+        f.write(b"ENDATA\n")
+
+    if solve:
+        with phase("Solve"):
+            model = gpy.read(file)
+            model.Params.OutputFlag = 0
+            model.Params.TimeLimit = 0
+            model.optimize()
+
+
+def digits(ids, width):
+    # the decimal digits of the integers ids, zero padded to width, as one
+    # row of bytes per integer
+    out = np.empty((len(ids), width), dtype=np.uint8)
+    ids = ids.astype(np.uint32)
+    for p in range(width - 1, -1, -1):
+        ids, out[:, p] = np.divmod(ids, 10)
+    out += ord("0")
+    return out
@@ -3,44 +3,41 @@ import subprocess
 import pandas as pd
 import numpy as np
 
+from gdx_export import GdxExport
 
-########## GAMS ##########
-def data_to_gams(I, J, K, L, M, IK, IL, IM, IJK, IKL, ILM, D):
-    c = gt.Container()
-
-    # create sets
-    i = c.addSet("i", records=I)
-    j = c.addSet("j", records=J)
-    k = c.addSet("k", records=K)
-    l = c.addSet("l", records=L)
-    m = c.addSet("m", records=M)
 
-    c.addSet("IK", [i, k], records=IK)
-    c.addSet("IL", [i, l], records=IL)
-    c.addSet("IM", [i, m], records=IM)
-    c.addSet("IJK", [i, j, k], records=IJK)
-    c.addSet("IKL", [i, k, l], records=IKL)
-    c.addSet("ILM", [i, l, m], records=ILM)
+########## GAMS ##########
+def gams_export(J, K, L, M):
+    # one container for the sweep, data_to_gams only adds the products
+    export = GdxExport("supply_chain/data/data.gdx")
+    for name, S in zip("ijklm", ([], J, K, L, M)):
+        export.set_domain(name, len(S))
 
     # create parameter
+    c = export.container
     c.addParameter("time")
-    df_d = pd.DataFrame([(i, m, D[i, m]) for i, m in IM], columns=["i", "m", "value"])
-    c.addParameter("d", [i, m], records=df_d)
 
     # create variables
     c.addVariable("f")
-    c.addVariable("x", domain=[i, j, k])
-    c.addVariable("y", domain=[i, k, l])
-    c.addVariable("z", domain=[i, l, m])
+    c.addVariable("x", domain=[c["i"], c["j"], c["k"]])
+    c.addVariable("y", domain=[c["i"], c["k"], c["l"]])
+    c.addVariable("z", domain=[c["i"], c["l"], c["m"]])
+    return export
 
-    c.write("supply_chain/data/data.gdx")
 
+def data_to_gams(export, I, IK, IL, IM, IJK, IKL, ILM, D):
+    export.set_domain("i", len(I))
+    export.set_records("IK", ["i", "k"], IK)
+    export.set_records("IL", ["i", "l"], IL)
+    export.set_records("IM", ["i", "m"], IM)
+    export.set_records("IJK", ["i", "j", "k"], IJK)
+    export.set_records("IKL", ["i", "k", "l"], IKL)
+    export.set_records("ILM", ["i", "l", "m"], ILM)
+    export.set_parameter("d", ["i", "m"], IM, D)
+    export.write()
 
-def run_gams(I, J, K, L, M, IK, IL, IM, IJK, IKL, ILM, D, solve, N, repeats, number):
-    data_to_gams(
-        I=I, J=J, K=K, L=L, M=M, IK=IK, IL=IL, IM=IM, IJK=IJK, IKL=IKL, ILM=ILM, D=D
-    )
 
+def run_gams(solve, N, repeats, number):
     if solve:
         subprocess.call(
             f"gams supply_chain/supply_chain.gms --solve={solve} --R={repeats} --N={number}",
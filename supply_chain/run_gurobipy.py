@@ -1,8 +1,16 @@
 import timeit
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
 import pandas as pd
 import numpy as np
 import gurobipy as gpy
 
+from supply_chain.data_generation import supply_chain_matrix
+from sparse_index import product_block
+from measure import time_model, time_step, time_updates, phase, model_size
+
 
 ########## Gurobi ##########
 def run_gurobi(I, ik, il, im, ijk, ikl, ilm, D, solve, repeats, number):
@@ -26,11 +34,11 @@ def run_gurobi(I, ik, il, im, ijk, ikl, ilm, D, solve, repeats, number):
         "solve": solve,
         "model_function": gurobi,
     }
-    r = timeit.repeat(
+    r, metrics = time_model(
         "model_function(IK, IL, IM, IJK, IKL, ILM, D, solve)",
-        repeat=repeats,
+        setup,
+        repeats=repeats,
         number=number,
-        globals=setup,
     )
 
     result = pd.DataFrame(
@@ -40,6 +48,7 @@ def run_gurobi(I, ik, il, im, ijk, ikl, ilm, D, solve, repeats, number):
             "MinTime": [np.min(r)],
             "MeanTime": [np.mean(r)],
             "MedianTime": [np.median(r)],
+            **metrics,
         }
     )
     return result
@@ -48,35 +57,41 @@ def run_gurobi(I, ik, il, im, ijk, ikl, ilm, D, solve, repeats, number):
 def gurobi(IK, IL, IM, IJK, IKL, ILM, d, solve):
     model = gpy.Model()
 
-    x = model.addVars(IJK, name="x")
-    y = model.addVars(IKL, name="y")
-    z = model.addVars(ILM, name="z")
+    with phase("Variables"):
+        x = model.addVars(IJK, name="x")
+        y = model.addVars(IKL, name="y")
+        z = model.addVars(ILM, name="z")
 
-    model.setObjective(1, gpy.GRB.MINIMIZE)
+        model.setObjective(1, gpy.GRB.MINIMIZE)
 
-    model.addConstrs(
-        gpy.quicksum(x[i, j, k] for (i, j, k) in IJK.select(i, "*", k))
-        >= gpy.quicksum(y[i, k, l] for (i, k, l) in IKL.select(i, k, "*"))
-        for (i, k) in IK
-    )
+    with phase("Constraints"):
+        model.addConstrs(
+            gpy.quicksum(x[i, j, k] for (i, j, k) in IJK.select(i, "*", k))
+            >= gpy.quicksum(y[i, k, l] for (i, k, l) in IKL.select(i, k, "*"))
+            for (i, k) in IK
+        )
 
-    model.addConstrs(
-        gpy.quicksum(y[i, k, l] for (i, k, l) in IKL.select(i, "*", l))
-        >= gpy.quicksum(z[i, l, m] for (i, l, m) in ILM.select(i, l, "*"))
-        for (i, l) in IL
-    )
+        model.addConstrs(
+            gpy.quicksum(y[i, k, l] for (i, k, l) in IKL.select(i, "*", l))
+            >= gpy.quicksum(z[i, l, m] for (i, l, m) in ILM.select(i, l, "*"))
+            for (i, l) in IL
+        )
 
-    model.addConstrs(
-        gpy.quicksum(z[i, l, m] for (i, l, m) in ILM.select(i, "*", m)) >= d[i, m]
-        for (i, m) in IM
-    )
+        model.addConstrs(
+            gpy.quicksum(z[i, l, m] for (i, l, m) in ILM.select(i, "*", m)) >= d[i, m]
+            for (i, m) in IM
+        )
 
-    model.update()
+    with phase("Handoff"):
+        model.update()
 
     if solve:
-        model.Params.OutputFlag = 0
-        model.Params.TimeLimit = 0
-        model.optimize()
+        with phase("Solve"):
+            model.Params.OutputFlag = 0
+            model.Params.TimeLimit = 0
+            model.optimize()
+
+    return model
 
 
 ########## Fast Gurobi ##########
@@ -122,11 +137,11 @@ def run_fast_gurobi(
         "solve": solve,
         "model_function": fast_gurobi,
     }
-    r = timeit.repeat(
+    r, metrics = time_model(
         "model_function(IK, IL, IM, IJK, IKL, ILM, IK_IJK, IK_IKL, IL_IKL, IL_ILM, IM_ILM, D, solve)",
-        repeat=repeats,
+        setup,
+        repeats=repeats,
         number=number,
-        globals=setup,
     )
 
     result = pd.DataFrame(
@@ -136,6 +151,7 @@ def run_fast_gurobi(
             "MinTime": [np.min(r)],
             "MeanTime": [np.mean(r)],
             "MedianTime": [np.median(r)],
+            **metrics,
         }
     )
     return result
@@ -144,32 +160,341 @@ def run_fast_gurobi(
 def fast_gurobi(IK, IL, IM, IJK, IKL, ILM, IK_IJK, IK_IKL, IL_IKL, IL_ILM, IM_ILM, d, solve):
     model = gpy.Model()
 
-    x = model.addVars(IJK, name="x")
-    y = model.addVars(IKL, name="y")
-    z = model.addVars(ILM, name="z")
+    with phase("Variables"):
+        x = model.addVars(IJK, name="x")
+        y = model.addVars(IKL, name="y")
+        z = model.addVars(ILM, name="z")
+
+        model.setObjective(1, gpy.GRB.MINIMIZE)
+
+    with phase("Constraints"):
+        model.addConstrs(
+            gpy.quicksum(x[ijk] for ijk in IK_IJK[i, k])
+            >= gpy.quicksum(y[ikl] for ikl in IK_IKL[i, k])
+            for (i, k) in IK
+        )
+
+        model.addConstrs(
+            gpy.quicksum(y[ikl] for ikl in IL_IKL[i, l])
+            >= gpy.quicksum(z[ilm] for ilm in IL_ILM[i, l])
+            for (i, l) in IL
+        )
+
+        # kept on the model for the right-hand side updates of the warm runs
+        model._demand = model.addConstrs(
+            gpy.quicksum(z[ilm] for ilm in IM_ILM[i,m]) >= d[i, m]
+            for (i, m) in IM
+        )
+
+    with phase("Handoff"):
+        model.update()
+
+    if solve:
+        with phase("Solve"):
+            model.Params.OutputFlag = 0
+            model.Params.TimeLimit = 0
+            model.optimize()
+
+    return model
+
+
+########## Warm Gurobi ##########
+def run_warm_gurobi(
+    I,
+    ik,
+    il,
+    im,
+    ijk,
+    ikl,
+    ilm,
+    ik_ijk,
+    ik_ikl,
+    il_ikl,
+    il_ilm,
+    im_ilm,
+    D,
+    demands,
+    solve,
+    repeats,
+    number,
+):
+    # fast_gurobi built once, every row of demands replaces the right-hand
+    # sides of the demand rows, in the order of im, and re-solves. The build
+    # and first solve are timed once, the updates by time_updates.
+    start = timeit.default_timer()
+    model = fast_gurobi(
+        gpy.tuplelist(ik),
+        gpy.tuplelist(il),
+        gpy.tuplelist(im),
+        gpy.tuplelist(ijk),
+        gpy.tuplelist(ikl),
+        gpy.tuplelist(ilm),
+        ik_ijk,
+        ik_ikl,
+        il_ikl,
+        il_ilm,
+        im_ilm,
+        D,
+        solve=False,
+    )
+    demand = [model._demand[i, m] for (i, m) in im]
+    model.Params.OutputFlag = 0
+    model.Params.TimeLimit = 0
+
+    # the first solve is cold, as in the other warm runners it is part of
+    # the build
+    if solve:
+        model.optimize()
+    build = timeit.default_timer() - start
 
-    model.setObjective(1, gpy.GRB.MINIMIZE)
+    def update(model, d):
+        # without a solve the new right-hand sides are only queued until the
+        # next update
+        model.setAttr("RHS", demand, d.tolist())
+        if solve:
+            model.optimize()
+        else:
+            model.update()
 
-    model.addConstrs(
-        gpy.quicksum(x[ijk] for ijk in IK_IJK[i, k])
-        >= gpy.quicksum(y[ikl] for ikl in IK_IKL[i, k])
-        for (i, k) in IK
+    metrics = time_updates(update, model, demands, repeats, number)
+
+    result = pd.DataFrame(
+        {
+            "I": [len(I)],
+            "Language": ["Warm GurobiPy"],
+            "MinTime": [build],
+            "MeanTime": [build],
+            "MedianTime": [build],
+            **metrics,
+        }
     )
+    return result
+
 
-    model.addConstrs(
-        gpy.quicksum(y[ikl] for ikl in IL_IKL[i, l])
-        >= gpy.quicksum(z[ilm] for ilm in IL_ILM[i, l])
-        for (i, l) in IL
+########## Matrix Gurobi ##########
+def run_matrix_gurobi(
+    I, K, L, M, IK, IL, IM, IJK, IKL, ILM, D, solve, repeats, number
+):
+    # integer coded sets as arrays, D the demand of every row of IM
+    setup = {
+        "shape": (len(I), len(K), len(L), len(M)),
+        "IK": IK,
+        "IL": IL,
+        "IM": IM,
+        "IJK": IJK,
+        "IKL": IKL,
+        "ILM": ILM,
+        "D": D,
+        "solve": solve,
+        "model_function": matrix_gurobi,
+    }
+    r, metrics = time_model(
+        "model_function(shape, IK, IL, IM, IJK, IKL, ILM, D, solve)",
+        setup,
+        repeats=repeats,
+        number=number,
     )
 
-    model.addConstrs(
-        gpy.quicksum(z[ilm] for ilm in IM_ILM[i,m]) >= d[i, m]
-        for (i, m) in IM
+    result = pd.DataFrame(
+        {
+            "I": [len(I)],
+            "Language": ["Matrix GurobiPy"],
+            "MinTime": [np.min(r)],
+            "MeanTime": [np.mean(r)],
+            "MedianTime": [np.median(r)],
+            **metrics,
+        }
     )
+    return result
+
+
+def matrix_gurobi(shape, IK, IL, IM, IJK, IKL, ILM, D, solve):
+    model = gpy.Model()
+
+    with phase("Variables"):
+        v = model.addMVar(len(IJK) + len(IKL) + len(ILM), name="v")
+
+        model.setObjective(1, gpy.GRB.MINIMIZE)
+
+    with phase("Constraints"):
+        A, rhs = supply_chain_matrix(shape, IK, IL, IM, IJK, IKL, ILM, D)
+        model.addMConstr(A, v, ">", rhs)
+
+    with phase("Handoff"):
+        model.update()
+    model_size(model.NumVars, model.NumConstrs)
+
+    if solve:
+        with phase("Solve"):
+            model.Params.OutputFlag = 0
+            model.Params.TimeLimit = 0
+            model.optimize()
+
+    return model
+
+
+########## Incremental Matrix Gurobi ##########
+def run_incremental_gurobi(
+    state, I, K, L, M, IK, IL, IM, IJK, IKL, ILM, D, solve, repeats, number
+):
+    # adds the products new since the last n to the matrix model in state
+    added = len(I) - state.get("n", 0)
+
+    setup = {
+        "state": state,
+        "shape": (len(I), len(K), len(L), len(M)),
+        "IK": IK,
+        "IL": IL,
+        "IM": IM,
+        "IJK": IJK,
+        "IKL": IKL,
+        "ILM": ILM,
+        "D": D,
+        "solve": solve,
+        "model_function": extend_matrix_gurobi,
+    }
+    r, metrics = time_step("model_function(state, shape, IK, IL, IM, IJK, IKL, ILM, D, solve)", setup)
+
+    result = pd.DataFrame(
+        {
+            "I": [len(I)],
+            "Language": ["Incremental Matrix GurobiPy"],
+            "MinTime": [np.min(r)],
+            "MeanTime": [np.mean(r)],
+            "MedianTime": [np.median(r)],
+            "MarginalTime": [np.min(r) / added if added else np.nan],
+            **metrics,
+        }
+    )
+    return result
+
+
+def extend_matrix_gurobi(state, shape, IK, IL, IM, IJK, IKL, ILM, D, solve):
+    # the model of matrix_gurobi for the products state["n"], ..., n - 1
+    # added to the model in state, which is created on the first call. No
+    # row links two products, so the new rows only use the new variables.
+    if "model" not in state:
+        model = gpy.Model()
+        model.setObjective(1, gpy.GRB.MINIMIZE)
+        model.Params.OutputFlag = 0
+        model.Params.TimeLimit = 0
+        state.update(model=model, n=0)
+    model, known, (n, *sizes) = state["model"], state["n"], shape
+
+    with phase("Data"):
+        sets = [product_block(S, known) for S in (IK, IL, IM, IJK, IKL, ILM)]
+        d = D[len(D) - len(sets[2]) :]
+
+    with phase("Variables"):
+        v = model.addMVar(sum(map(len, sets[3:])), name=f"v_{known}")
+
+    with phase("Constraints"):
+        A, rhs = supply_chain_matrix((n - known, *sizes), *sets, d)
+        model.addMConstr(A, v, ">", rhs)
+
+    with phase("Handoff"):
+        model.update()
+
+    if solve:
+        with phase("Solve"):
+            model.optimize()
+
+    state["n"] = n
+    return model
+
+
+########## Decomposed Matrix Gurobi ##########
+# instance of the pool workers of run_decomposed_gurobi, set on start
+BLOCK_DATA = {}
+
+
+def run_decomposed_gurobi(
+    I,
+    K,
+    L,
+    M,
+    IK,
+    IL,
+    IM,
+    IJK,
+    IKL,
+    ILM,
+    D,
+    workers,
+    blocks,
+    solve,
+    repeats,
+    number,
+):
+    # No row links two products, so the model splits into independent
+    # models of blocks of products, built and solved by a pool of workers.
+    # The workers inherit the instance on start and get the product ranges.
+    # Memory and profiler measurements of the parent would miss the workers,
+    # so the runs are timed with plain timeit, after one untimed run for the
+    # merged size and the solver status of the blocks.
+    bounds = np.linspace(0, len(I), blocks + 1).astype(int).tolist()
+    instance = {
+        "sizes": (len(K), len(L), len(M)),
+        "sets": (IK, IL, IM, IJK, IKL, ILM),
+        "D": D,
+    }
+    with ProcessPoolExecutor(
+        workers,
+        mp_context=mp.get_context("fork"),
+        initializer=BLOCK_DATA.update,
+        initargs=(instance,),
+    ) as pool:
+        # start every worker before the timed runs
+        list(pool.map(int, range(workers)))
+        variables, constraints, status = decomposed_gurobi(pool, bounds, solve)
+
+        setup = {
+            "pool": pool,
+            "bounds": bounds,
+            "solve": solve,
+            "model_function": decomposed_gurobi,
+        }
+        r = timeit.Timer(
+            "model_function(pool, bounds, solve)", globals=setup
+        ).repeat(repeats, number)
+
+    result = pd.DataFrame(
+        {
+            "I": [len(I)],
+            "Language": [f"Decomposed Matrix GurobiPy ({workers})"],
+            "MinTime": [np.min(r)],
+            "MeanTime": [np.mean(r)],
+            "MedianTime": [np.median(r)],
+            "Workers": [workers],
+            "Variables": [variables],
+            "Constraints": [constraints],
+            "SolverStatus": [" ".join(map(str, sorted(set(status))))],
+        }
+    )
+    return result
+
+
+def decomposed_gurobi(pool, bounds, solve):
+    # merged size and the status of every model of the product blocks, the
+    # status codes have no order of severity
+    sizes = list(pool.map(solve_block, bounds[:-1], bounds[1:], repeat(solve)))
+    variables, constraints, status = zip(*sizes)
+    return sum(variables), sum(constraints), list(status)
+
 
-    model.update()
+def solve_block(start, stop, solve):
+    # matrix_gurobi of the products start, ..., stop - 1, single threaded as
+    # the blocks already use every worker
+    sets = [product_block(S, start, stop) for S in BLOCK_DATA["sets"]]
+    IM = BLOCK_DATA["sets"][2]
+    first = np.searchsorted(IM[:, 0], start)
+    d = BLOCK_DATA["D"][first : first + len(sets[2])]
 
+    shape = (stop - start, *BLOCK_DATA["sizes"])
+    model = matrix_gurobi(shape, *sets, d, solve=False)
     if solve:
         model.Params.OutputFlag = 0
         model.Params.TimeLimit = 0
+        model.Params.Threads = 1
         model.optimize()
+    return model.NumVars, model.NumConstrs, model.Status
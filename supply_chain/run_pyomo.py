@@ -1,9 +1,14 @@
+import timeit
 import pyomo.environ as pyo
+import pyomo.kernel as pmo
 import logging
-import timeit
 import pandas as pd
 import numpy as np
 
+from supply_chain.data_generation import supply_chain_matrix
+from sparse_index import product_block
+from measure import time_model, time_step, time_updates, phase
+
 logging.getLogger("pyomo.core").setLevel(logging.ERROR)
 
 
@@ -20,11 +25,11 @@ def run_pyomo(I, IK, IL, IM, IJK, IKL, ILM, D, solve, repeats, number):
         "solve": solve,
         "model_function": pyomo,
     }
-    r = timeit.repeat(
+    r, metrics = time_model(
         "model_function(IK, IL, IM, IJK, IKL, ILM, D, solve)",
-        repeat=repeats,
+        setup,
+        repeats=repeats,
         number=number,
-        globals=setup,
     )
 
     result = pd.DataFrame(
@@ -34,6 +39,7 @@ def run_pyomo(I, IK, IL, IM, IJK, IKL, ILM, D, solve, repeats, number):
             "MinTime": [np.min(r)],
             "MeanTime": [np.mean(r)],
             "MedianTime": [np.median(r)],
+            **metrics,
         }
     )
     return result
@@ -42,31 +48,38 @@ def run_pyomo(I, IK, IL, IM, IJK, IKL, ILM, D, solve, repeats, number):
 def pyomo(IK, IL, IM, IJK, IKL, ILM, D, solve):
     model = pyo.ConcreteModel()
 
-    model.IK = pyo.Set(initialize=IK)
-    model.IL = pyo.Set(initialize=IL)
-    model.IM = pyo.Set(initialize=IM)
-    model.IJK = pyo.Set(initialize=IJK)
-    model.IKL = pyo.Set(initialize=IKL)
-    model.ILM = pyo.Set(initialize=ILM)
+    with phase("Sets"):
+        model.IK = pyo.Set(initialize=IK)
+        model.IL = pyo.Set(initialize=IL)
+        model.IM = pyo.Set(initialize=IM)
+        model.IJK = pyo.Set(initialize=IJK)
+        model.IKL = pyo.Set(initialize=IKL)
+        model.ILM = pyo.Set(initialize=ILM)
 
-    model.f = pyo.Param(default=1)
-    model.d = pyo.Param(model.IM, initialize=D)
+        model.f = pyo.Param(default=1)
+        model.d = pyo.Param(model.IM, initialize=D)
 
-    model.x = pyo.Var(model.IJK, domain=pyo.NonNegativeReals)
-    model.y = pyo.Var(model.IKL, domain=pyo.NonNegativeReals)
-    model.z = pyo.Var(model.ILM, domain=pyo.NonNegativeReals)
+    with phase("Variables"):
+        model.x = pyo.Var(model.IJK, domain=pyo.NonNegativeReals)
+        model.y = pyo.Var(model.IKL, domain=pyo.NonNegativeReals)
+        model.z = pyo.Var(model.ILM, domain=pyo.NonNegativeReals)
 
-    model.OBJ = pyo.Objective(expr=model.f)
+    with phase("Constraints"):
+        model.OBJ = pyo.Objective(expr=model.f)
 
-    model.production = pyo.Constraint(model.IK, rule=production_rule)
-    model.transport = pyo.Constraint(model.IL, rule=transport_rule)
-    model.demand = pyo.Constraint(model.IM, rule=demand_rule)
+        model.production = pyo.Constraint(model.IK, rule=production_rule)
+        model.transport = pyo.Constraint(model.IL, rule=transport_rule)
+        model.demand = pyo.Constraint(model.IM, rule=demand_rule)
 
     # model.write("int.lp")
 
+    # the solver interface writes the problem file and solves in one call
     if solve:
-        opt = pyo.SolverFactory("gurobi")
-        opt.solve(model, options={"TimeLimit": 0}, load_solutions=False)
+        with phase("Solve"):
+            opt = pyo.SolverFactory("gurobi")
+            opt.solve(model, options={"TimeLimit": 0}, load_solutions=False)
+
+    return model
 
 
 def production_rule(model, i, k):
@@ -114,20 +127,21 @@ def run_fast_pyomo(
         "IJK": IJK,
         "IKL": IKL,
         "ILM": ILM,
-        "IK_IJK": IK_IJK,
-        "IK_IKL": IK_IKL,
-        "IL_IKL": IL_IKL,
-        "IL_ILM": IL_ILM,
-        "IM_ILM": IM_ILM,
+        # Pyomo initializes the indexed sets from plain dicts
+        "IK_IJK": IK_IJK.to_dict(),
+        "IK_IKL": IK_IKL.to_dict(),
+        "IL_IKL": IL_IKL.to_dict(),
+        "IL_ILM": IL_ILM.to_dict(),
+        "IM_ILM": IM_ILM.to_dict(),
         "D": D,
         "solve": solve,
         "model_function": fast_pyomo,
     }
-    r = timeit.repeat(
+    r, metrics = time_model(
         "model_function(IK, IL, IM, IJK, IKL, ILM, IK_IJK, IK_IKL, IL_IKL, IL_ILM, IM_ILM, D, solve)",
-        repeat=repeats,
+        setup,
+        repeats=repeats,
         number=number,
-        globals=setup,
     )
 
     result = pd.DataFrame(
@@ -137,45 +151,69 @@ def run_fast_pyomo(
             "MinTime": [np.min(r)],
             "MeanTime": [np.mean(r)],
             "MedianTime": [np.median(r)],
+            **metrics,
         }
     )
     return result
 
 
-def fast_pyomo(IK, IL, IM, IJK, IKL, ILM, IK_IJK, IK_IKL, IL_IKL, IL_ILM, IM_ILM, D, solve):
+def fast_pyomo(
+    IK,
+    IL,
+    IM,
+    IJK,
+    IKL,
+    ILM,
+    IK_IJK,
+    IK_IKL,
+    IL_IKL,
+    IL_ILM,
+    IM_ILM,
+    D,
+    solve,
+    mutable=False,
+):
     model = pyo.ConcreteModel()
 
-    model.IK = pyo.Set(initialize=IK)
-    model.IL = pyo.Set(initialize=IL)
-    model.IM = pyo.Set(initialize=IM)
-    model.IJK = pyo.Set(initialize=IJK)
-    model.IKL = pyo.Set(initialize=IKL)
-    model.ILM = pyo.Set(initialize=ILM)
+    with phase("Sets"):
+        model.IK = pyo.Set(initialize=IK)
+        model.IL = pyo.Set(initialize=IL)
+        model.IM = pyo.Set(initialize=IM)
+        model.IJK = pyo.Set(initialize=IJK)
+        model.IKL = pyo.Set(initialize=IKL)
+        model.ILM = pyo.Set(initialize=ILM)
 
-    model.IK_IJK = pyo.Set(IK_IJK.keys(), initialize=IK_IJK)
-    model.IK_IKL = pyo.Set(IK_IKL.keys(), initialize=IK_IKL)
-    model.IL_IKL = pyo.Set(IL_IKL.keys(), initialize=IL_IKL)
-    model.IL_ILM = pyo.Set(IL_ILM.keys(), initialize=IL_ILM)
-    model.IM_ILM = pyo.Set(IM_ILM.keys(), initialize=IM_ILM)
+        model.IK_IJK = pyo.Set(IK_IJK.keys(), initialize=IK_IJK)
+        model.IK_IKL = pyo.Set(IK_IKL.keys(), initialize=IK_IKL)
+        model.IL_IKL = pyo.Set(IL_IKL.keys(), initialize=IL_IKL)
+        model.IL_ILM = pyo.Set(IL_ILM.keys(), initialize=IL_ILM)
+        model.IM_ILM = pyo.Set(IM_ILM.keys(), initialize=IM_ILM)
 
-    model.f = pyo.Param(default=1)
-    model.d = pyo.Param(model.IM, initialize=D)
+        model.f = pyo.Param(default=1)
+        # mutable demand for the warm model, see run_warm_pyomo
+        model.d = pyo.Param(model.IM, initialize=D, mutable=mutable)
 
-    model.x = pyo.Var(model.IJK, domain=pyo.NonNegativeReals)
-    model.y = pyo.Var(model.IKL, domain=pyo.NonNegativeReals)
-    model.z = pyo.Var(model.ILM, domain=pyo.NonNegativeReals)
+    with phase("Variables"):
+        model.x = pyo.Var(model.IJK, domain=pyo.NonNegativeReals)
+        model.y = pyo.Var(model.IKL, domain=pyo.NonNegativeReals)
+        model.z = pyo.Var(model.ILM, domain=pyo.NonNegativeReals)
 
-    model.OBJ = pyo.Objective(expr=model.f)
+    with phase("Constraints"):
+        model.OBJ = pyo.Objective(expr=model.f)
 
-    model.production = pyo.Constraint(model.IK, rule=fast_production_rule)
-    model.transport = pyo.Constraint(model.IL, rule=fast_transport_rule)
-    model.demand = pyo.Constraint(model.IM, rule=fast_demand_rule)
+        model.production = pyo.Constraint(model.IK, rule=fast_production_rule)
+        model.transport = pyo.Constraint(model.IL, rule=fast_transport_rule)
+        model.demand = pyo.Constraint(model.IM, rule=fast_demand_rule)
 
     # model.write("int.lp")
 
+    # the solver interface writes the problem file and solves in one call
     if solve:
-        opt = pyo.SolverFactory("gurobi")
-        opt.solve(model, options={"TimeLimit": 0}, load_solutions=False)
+        with phase("Solve"):
+            opt = pyo.SolverFactory("gurobi")
+            opt.solve(model, options={"TimeLimit": 0}, load_solutions=False)
+
+    return model
 
 
 def fast_production_rule(model, i, k):
@@ -214,11 +252,11 @@ def run_cartesian_pyomo(
         "solve": solve,
         "model_function": cartesian_pyomo,
     }
-    r = timeit.repeat(
+    r, metrics = time_model(
         "model_function(I, J, K, L, M, IK, IL, IM, IJK, IKL, ILM, D, solve)",
-        repeat=repeats,
+        setup,
+        repeats=repeats,
         number=number,
-        globals=setup,
     )
 
     result = pd.DataFrame(
@@ -228,6 +266,7 @@ def run_cartesian_pyomo(
             "MinTime": [np.min(r)],
             "MeanTime": [np.mean(r)],
             "MedianTime": [np.median(r)],
+            **metrics,
         }
     )
     return result
@@ -266,3 +305,276 @@ def cartesian_pyomo(I, J, K, L, M, IK, IL, IM, IJK, IKL, ILM, D, solve):
     if solve:
         opt = pyo.SolverFactory("gurobi")
         opt.solve(model, options={"TimeLimit": 0}, load_solutions=False)
+
+    return model
+
+
+########## Kernel Pyomo ##########
+def run_kernel_pyomo(
+    I, K, L, M, IK, IL, IM, IJK, IKL, ILM, D, solve, repeats, number
+):
+    # integer coded sets as arrays, D the demand of every row of IM
+    setup = {
+        "shape": (len(I), len(K), len(L), len(M)),
+        "IK": IK,
+        "IL": IL,
+        "IM": IM,
+        "IJK": IJK,
+        "IKL": IKL,
+        "ILM": ILM,
+        "D": D,
+        "solve": solve,
+        "model_function": kernel_pyomo,
+    }
+    r, metrics = time_model(
+        "model_function(shape, IK, IL, IM, IJK, IKL, ILM, D, solve)",
+        setup,
+        repeats=repeats,
+        number=number,
+    )
+
+    result = pd.DataFrame(
+        {
+            "I": [len(I)],
+            "Language": ["Kernel Pyomo"],
+            "MinTime": [np.min(r)],
+            "MeanTime": [np.mean(r)],
+            "MedianTime": [np.median(r)],
+            **metrics,
+        }
+    )
+    return result
+
+
+def kernel_pyomo(shape, IK, IL, IM, IJK, IKL, ILM, D, solve):
+    model = pmo.block()
+
+    with phase("Variables"):
+        model.v = pmo.variable_list(
+            pmo.variable(lb=0) for _ in range(len(IJK) + len(IKL) + len(ILM))
+        )
+
+    with phase("Constraints"):
+        model.OBJ = pmo.objective(1)
+
+        A, rhs = supply_chain_matrix(shape, IK, IL, IM, IJK, IKL, ILM, D)
+        model.c = pmo.constraint_list(linear_constraints(list(model.v), A, rhs))
+
+    # the persistent solver translates the model once, the solve does not
+    # walk it again
+    if solve:
+        with phase("Handoff"):
+            opt = pyo.SolverFactory("gurobi_persistent")
+            opt.set_instance(model)
+
+        with phase("Solve"):
+            opt.solve(options={"TimeLimit": 0}, load_solutions=False)
+
+    return model
+
+
+def linear_constraints(v, A, rhs):
+    # one linear constraint A[r] v >= rhs[r] per row r of the CSR matrix A,
+    # the terms are kept as lists and no expression tree is built
+    ptr = A.indptr.tolist()
+    cols, coefficients = A.indices.tolist(), A.data.tolist()
+    return [
+        pmo.linear_constraint(
+            variables=[v[c] for c in cols[start:stop]],
+            coefficients=coefficients[start:stop],
+            lb=lb,
+        )
+        for start, stop, lb in zip(ptr[:-1], ptr[1:], rhs.tolist())
+    ]
+
+
+########## Warm Pyomo ##########
+def run_warm_pyomo(
+    I,
+    IK,
+    IL,
+    IM,
+    IJK,
+    IKL,
+    ILM,
+    IK_IJK,
+    IK_IKL,
+    IL_IKL,
+    IL_ILM,
+    IM_ILM,
+    D,
+    demands,
+    solve,
+    repeats,
+    number,
+):
+    # fast_pyomo built once with a mutable d, every row of demands replaces d
+    # and re-solves in the same persistent APPSI solver. The build and first
+    # solve are timed once, the updates by time_updates.
+    start = timeit.default_timer()
+    model = fast_pyomo(
+        IK,
+        IL,
+        IM,
+        IJK,
+        IKL,
+        ILM,
+        IK_IJK.to_dict(),
+        IK_IKL.to_dict(),
+        IL_IKL.to_dict(),
+        IL_ILM.to_dict(),
+        IM_ILM.to_dict(),
+        D,
+        solve=False,
+        mutable=True,
+    )
+
+    # the first solve passes the whole model to the solver, later solves
+    # only the changed values of d
+    if solve:
+        opt = pyo.SolverFactory("appsi_gurobi")
+        opt.solve(model, options={"TimeLimit": 0}, load_solutions=False)
+    build = timeit.default_timer() - start
+
+    def update(model, d):
+        model.d.store_values(dict(zip(IM, d.tolist())))
+        if solve:
+            opt.solve(model, options={"TimeLimit": 0}, load_solutions=False)
+
+    metrics = time_updates(update, model, demands, repeats, number)
+
+    result = pd.DataFrame(
+        {
+            "I": [len(I)],
+            "Language": ["Warm Pyomo"],
+            "MinTime": [build],
+            "MeanTime": [build],
+            "MedianTime": [build],
+            **metrics,
+        }
+    )
+    return result
+
+
+########## Warm Kernel Pyomo ##########
+def run_warm_kernel_pyomo(
+    I, K, L, M, IK, IL, IM, IJK, IKL, ILM, D, demands, solve, repeats, number
+):
+    # kernel_pyomo built once, every row of demands replaces the bounds of
+    # the demand rows, the last rows of the model, and re-solves in the same
+    # persistent solver. The build and first solve are timed once, the
+    # updates by time_updates.
+    start = timeit.default_timer()
+    shape = (len(I), len(K), len(L), len(M))
+    model = kernel_pyomo(shape, IK, IL, IM, IJK, IKL, ILM, D, solve=False)
+    demand = list(model.c)[len(model.c) - len(IM) :]
+
+    # the first solve is cold, as in the other warm runners it is part of
+    # the build
+    if solve:
+        opt = pyo.SolverFactory("gurobi_persistent")
+        opt.set_instance(model)
+        opt.solve(options={"TimeLimit": 0}, load_solutions=False)
+    build = timeit.default_timer() - start
+
+    def update(model, d):
+        for c, value in zip(demand, d.tolist()):
+            c.lb = value
+            if solve:
+                opt.set_linear_constraint_attr(c, "RHS", value)
+        if solve:
+            opt.solve(options={"TimeLimit": 0}, load_solutions=False)
+
+    metrics = time_updates(update, model, demands, repeats, number)
+
+    result = pd.DataFrame(
+        {
+            "I": [len(I)],
+            "Language": ["Warm Kernel Pyomo"],
+            "MinTime": [build],
+            "MeanTime": [build],
+            "MedianTime": [build],
+            **metrics,
+        }
+    )
+    return result
+
+
+########## Incremental Kernel Pyomo ##########
+def run_incremental_kernel_pyomo(
+    state, I, K, L, M, IK, IL, IM, IJK, IKL, ILM, D, solve, repeats, number
+):
+    # adds the products new since the last n to the kernel model in state
+    added = len(I) - state.get("n", 0)
+
+    setup = {
+        "state": state,
+        "shape": (len(I), len(K), len(L), len(M)),
+        "IK": IK,
+        "IL": IL,
+        "IM": IM,
+        "IJK": IJK,
+        "IKL": IKL,
+        "ILM": ILM,
+        "D": D,
+        "solve": solve,
+        "model_function": extend_kernel_pyomo,
+    }
+    r, metrics = time_step("model_function(state, shape, IK, IL, IM, IJK, IKL, ILM, D, solve)", setup)
+
+    result = pd.DataFrame(
+        {
+            "I": [len(I)],
+            "Language": ["Incremental Kernel Pyomo"],
+            "MinTime": [np.min(r)],
+            "MeanTime": [np.mean(r)],
+            "MedianTime": [np.median(r)],
+            "MarginalTime": [np.min(r) / added if added else np.nan],
+            **metrics,
+        }
+    )
+    return result
+
+
+def extend_kernel_pyomo(state, shape, IK, IL, IM, IJK, IKL, ILM, D, solve):
+    # the model of kernel_pyomo for the products state["n"], ..., n - 1
+    # added to the model in state, which is created on the first call. No
+    # row links two products, so the new rows only use the new variables.
+    if "model" not in state:
+        model = pmo.block()
+        model.v = pmo.variable_list()
+        model.c = pmo.constraint_list()
+        model.OBJ = pmo.objective(1)
+        state.update(model=model, n=0)
+    model, known, (n, *sizes) = state["model"], state["n"], shape
+
+    with phase("Data"):
+        sets = [product_block(S, known) for S in (IK, IL, IM, IJK, IKL, ILM)]
+        d = D[len(D) - len(sets[2]) :]
+
+    with phase("Variables"):
+        v = [pmo.variable(lb=0) for _ in range(sum(map(len, sets[3:])))]
+        model.v.extend(v)
+
+    with phase("Constraints"):
+        A, rhs = supply_chain_matrix((n - known, *sizes), *sets, d)
+        c = linear_constraints(v, A, rhs)
+        model.c.extend(c)
+
+    # the persistent solver gets the whole model once, then only the additions
+    if solve:
+        with phase("Handoff"):
+            if "opt" not in state:
+                state["opt"] = pyo.SolverFactory("gurobi_persistent")
+                state["opt"].set_instance(model)
+            else:
+                for var in v:
+                    state["opt"].add_var(var)
+                for con in c:
+                    state["opt"].add_constraint(con)
+
+        with phase("Solve"):
+            state["opt"].solve(options={"TimeLimit": 0}, load_solutions=False)
+
+    state["n"] = n
+    return model
@@ -3,30 +3,51 @@ using JSON
 using DataFrames
 using BenchmarkTools
 using Gurobi
+using Mmap
 
 function read_tuple_list(filename)
     return [tuple(x...) for x in JSON.parsefile(filename)]
 end
 
+# binary exchange file of help.save_to_bin: magic, rows and columns as Int64,
+# then the rows of Int32 entries, mapped as one column per row
+function read_tuple_bin(filename)
+    open(filename) do io
+        read(io, 8) == b"PEXINT32" || error("$filename is not an exchange file")
+        rows, cols = read(io, Int64), read(io, Int64)
+        data = Mmap.mmap(io, Matrix{Int32}, (cols, rows), 24)
+        return [Tuple(c) for c in eachcol(data)]
+    end
+end
+
+function read_set(name, exchange)
+    if exchange == "bin"
+        return read_tuple_bin("supply_chain/data/data_$name.bin")
+    end
+    return read_tuple_list("supply_chain/data/data_$name.json")
+end
+
 function read_fixed_data()
     N = open(JSON.parse, "supply_chain/data/data_N.json")
     return N
 end
 
-function read_variable_data(n)
-    IK = read_tuple_list("supply_chain/data/data_IK_$n.json")
-    IL = read_tuple_list("supply_chain/data/data_IL_$n.json")
-    IM = read_tuple_list("supply_chain/data/data_IM_$n.json")
-    IJK = read_tuple_list("supply_chain/data/data_IJK_$n.json")
-    IKL = read_tuple_list("supply_chain/data/data_IKL_$n.json")
-    ILM = read_tuple_list("supply_chain/data/data_ILM_$n.json")
-    d = read_tuple_list("supply_chain/data/data_D_$n.json")
+function read_variable_data(n, exchange)
+    IK = read_set("IK_$n", exchange)
+    IL = read_set("IL_$n", exchange)
+    IM = read_set("IM_$n", exchange)
+    IJK = read_set("IJK_$n", exchange)
+    IKL = read_set("IKL_$n", exchange)
+    ILM = read_set("ILM_$n", exchange)
+    d = read_set("D_$n", exchange)
     D = Dict((i, m) => value for (i, m, value) in d)
     return IK, IL, IM, IJK, IKL, ILM, D
 end
 
 function convert_df_to_dict(groups)
-    dict = Dict{Tuple{String,String},Vector{Tuple{String,String,String}}}()
+    # labels or integer codes, as read
+    T = eltype(parent(groups)[!, 1])
+    dict = Dict{NTuple{2,T},Vector{NTuple{3,T}}}()
     for key in keys(groups)
         dict[values(key)] = Tuple.(Tables.namedtupleiterator(groups[key]))
     end
@@ -133,6 +154,43 @@ function fast_jump(IK, IL, IM, IJK, IKL, ILM, IK_IJK, IK_IKL, IL_IKL, IL_ILM, IM
     end
 end
 
+# worker mode, driven by julia_worker.JuliaWorker
+function run_job(job)
+    language, n, exchange = job["language"], job["n"], job["exchange"]
+    solve = job["solve"] ? "True" : "False"
+    samples, evals = job["repeats"], job["number"]
+    IK, IL, IM, IJK, IKL, ILM, D = read_variable_data(n, exchange)
+
+    if language == "Fast JuMP"
+        IK_IJK, IK_IKL, IL_IKL, IL_ILM, IM_ILM = convert_to_DF(IJK, IKL, ILM)
+        r = @benchmark fast_jump($IK, $IL, $IM, $IJK, $IKL, $ILM, $IK_IJK, $IK_IKL, $IL_IKL, $IL_ILM, $IM_ILM, $D, $solve) samples = samples evals = evals
+    else
+        r = @benchmark jump($IK, $IL, $IM, $IJK, $IKL, $ILM, $D, $solve) samples = samples evals = evals
+    end
+    return Dict("I" => n, "Language" => language, "times" => r.times ./ 1e9)
+end
+
+function serve()
+    # one JSON job per line on stdin, one JSON reply per line on stdout,
+    # everything else printed goes to stderr
+    out = stdout
+    redirect_stdout(stderr)
+    for line in eachline(stdin)
+        reply = try
+            run_job(JSON.parse(line))
+        catch e
+            Dict("error" => sprint(showerror, e))
+        end
+        println(out, JSON.json(reply))
+        flush(out)
+    end
+end
+
+if length(ARGS) >= 1 && ARGS[1] == "worker"
+    serve()
+    exit()
+end
+
 # solve = false
 # samples = 2
 # evals = 1
@@ -142,6 +200,7 @@ solve = ARGS[1]
 samples = parse(Int64, ARGS[2])
 evals = parse(Int64, ARGS[3])
 time_limit = parse(Int64, ARGS[4])
+exchange = length(ARGS) >= 5 ? ARGS[5] : "json"
 
 N = read_fixed_data()
 
@@ -149,7 +208,7 @@ t = DataFrame(I=Int[], Language=String[], MinTime=Float64[], MeanTime=Float64[],
 tt = DataFrame(I=Int[], Language=String[], MinTime=Float64[], MeanTime=Float64[], MedianTime=Float64[])
 
 for n in N
-    IK, IL, IM, IJK, IKL, ILM, D = read_variable_data(n)
+    IK, IL, IM, IJK, IKL, ILM, D = read_variable_data(n, exchange)
     IK_IJK, IK_IKL, IL_IKL, IL_ILM, IM_ILM = convert_to_DF(IJK, IKL, ILM)
 
     if maximum(t.MinTime; init=0) < time_limit
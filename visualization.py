@@ -1,6 +1,8 @@
 import seaborn as sns
 import matplotlib.pyplot as plt
 
+from measure import MEMORY_METRICS, PHASE_NAMES
+
 
 def plot_results(df, cardinality_of_j, solve, model):
     # Apply the default theme
@@ -33,3 +35,66 @@ def plot_results(df, cardinality_of_j, solve, model):
     plot.set(xlabel=r"$|\mathcal{I}|$", ylabel=y_label)
 
     plt.savefig(f"plots/{model}/{filename}", dpi=300)
+
+    # latency per update of the warm series, their MinTime above is the build
+    if "UpdateMinTime" in df and df["UpdateMinTime"].notna().any():
+        plot = sns.relplot(
+            data=df.dropna(subset=["UpdateMinTime"]),
+            x="I",
+            y="UpdateMinTime",
+            hue="Language",
+            kind="line",
+            palette="muted",
+        )
+        plot.set(xlabel=r"$|\mathcal{I}|$", ylabel="Time per Update [s]")
+        plt.savefig(f"plots/{model}/updates_{filename}", dpi=300)
+
+    # memory measurements, one panel per metric
+    metrics = [c for c in MEMORY_METRICS if c in df and df[c].notna().any()]
+    if metrics:
+        df_memory = df.melt(
+            id_vars=["I", "Language"],
+            value_vars=metrics,
+            var_name="Metric",
+            value_name="Value",
+        )
+        plot = sns.relplot(
+            data=df_memory,
+            x="I",
+            y="Value",
+            hue="Language",
+            col="Metric",
+            col_wrap=3,
+            kind="line",
+            palette="muted",
+            facet_kws={"sharey": False},
+        )
+        plot.set(xlabel=r"$|\mathcal{I}|$", ylabel="Bytes / Blocks")
+        plt.savefig(f"plots/{model}/memory_{filename}", dpi=300)
+
+    # time per phase of the fastest repeat, stacked per framework
+    phases = [
+        f"Phase{name}"
+        for name in PHASE_NAMES + ["Other"]
+        if f"Phase{name}" in df and df[f"Phase{name}"].notna().any()
+    ]
+    languages = [
+        language
+        for language in df["Language"].unique()
+        if df.loc[df["Language"] == language, phases].notna().any(axis=None)
+    ]
+    if languages:
+        fig, axes = plt.subplots(
+            1, len(languages), figsize=(5 * len(languages), 4), squeeze=False
+        )
+        for ax, language in zip(axes[0], languages):
+            df_phases = df[df["Language"] == language].sort_values("I")
+            ax.stackplot(
+                df_phases["I"],
+                df_phases[phases].fillna(0).T,
+                labels=[p.removeprefix("Phase") for p in phases],
+            )
+            ax.set(title=language, xlabel=r"$|\mathcal{I}|$", ylabel=y_label)
+        axes[0][-1].legend(loc="upper left")
+        fig.tight_layout()
+        plt.savefig(f"plots/{model}/phases_{filename}", dpi=300)